@@ -1,52 +1,90 @@
 # achievements.py
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import asyncio
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
+from telegram.constants import MessageLimit
 from telegram.ext import ContextTypes
-from database import get_achievements
+import async_db as db
+import outbox
 from keyboards import achievements_navigation_keyboard, back_to_main_button
+from rendering import split_text, utf16_len
+import config
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _merge_texts(texts):
+    """دمج نصوص الإنجازات في أقل عدد من الرسائل ضمن حد تيليجرام (بوحدات UTF-16 كما يحسبها).
+    النص الأطول من الحد يُقسم على عدة رسائل بدل قصه."""
+    limit = MessageLimit.MAX_TEXT_LENGTH
+    messages, current, current_len = [], "", 0
+    for text in texts:
+        for piece in split_text(text, limit):
+            piece_len = utf16_len(piece)
+            if current and current_len + 2 + piece_len > limit:
+                messages.append(current)
+                current, current_len = piece, piece_len
+            elif current:
+                current, current_len = f"{current}\n\n{piece}", current_len + 2 + piece_len
+            else:
+                current, current_len = piece, piece_len
+    if current:
+        messages.append(current)
+    return messages
+
 async def show_achievements(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
-    achievements = get_achievements()
-    if not achievements:
-        await update.effective_message.reply_text(
+    query = update.callback_query
+    answer = None
+    if query and query.data.startswith("achievements_page_"):
+        # الرد على الزر بالتوازي مع قراءة الصفحة
+        answer = asyncio.ensure_future(query.answer())
+        page = int(query.data.split("_")[2])
+
+    total = await db.count_achievements()
+    if not total:
+        if answer:
+            await answer
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
             "لا توجد إنجازات بعد.",
             reply_markup=back_to_main_button()
-        )
+        ))
         return
 
-    per_page = 3  # عدد الإنجازات في الصفحة الواحدة
-    total_pages = (len(achievements) + per_page - 1) // per_page
-    start = page * per_page
-    end = start + per_page
-    current = achievements[start:end]
+    per_page = config.ACHIEVEMENTS_PER_PAGE  # عدد الإنجازات في الصفحة الواحدة (10 كحد أقصى للألبوم)
+    total_pages = (total + per_page - 1) // per_page
+    page = max(0, min(page, total_pages - 1))
+    current = await db.get_achievements_page(page * per_page, per_page)
+    if answer:
+        await answer
 
+    media, texts = [], []
     for ach in current:
         caption = ach['caption'] or ""
         if ach['type'] == 'text':
-            await update.effective_message.reply_text(
-                f"📝 {caption}\n\n{ach['content']}",
-                reply_markup=back_to_main_button() if ach == current[-1] else None
-            )
+            texts.append(f"📝 {caption}\n\n{ach['content']}")
         elif ach['type'] == 'photo':
-            await context.bot.send_photo(
-                chat_id=update.effective_chat.id,
-                photo=ach['content'],
-                caption=caption,
-                reply_markup=back_to_main_button() if ach == current[-1] else None
-            )
+            media.append(InputMediaPhoto(ach['content'], caption=caption))
         elif ach['type'] == 'video':
-            await context.bot.send_video(
-                chat_id=update.effective_chat.id,
-                video=ach['content'],
-                caption=caption,
-                reply_markup=back_to_main_button() if ach == current[-1] else None
-            )
-
-    # إذا كان هناك أكثر من صفحة، نعرض أزرار التنقل بعد آخر إنجاز
-    if total_pages > 1:
-        await update.effective_message.reply_text(
-            "لتصفح المزيد:",
-            reply_markup=achievements_navigation_keyboard(page, total_pages)
-        )
+            media.append(InputMediaVideo(ach['content'], caption=caption))
+
+    reply_markup = achievements_navigation_keyboard(page, total_pages) if total_pages > 1 else back_to_main_button()
+    chat_id = update.effective_chat.id
+
+    # الألبوم لا يقبل أزرار، لذلك تُرفق الأزرار بالرسالة النصية التي تليه
+    if len(media) == 1:
+        # عنصر واحد لا يحتاج ألبوماً، ويحمل الأزرار إن لم يكن بعده نص
+        item = media[0]
+        send = context.bot.send_photo if isinstance(item, InputMediaPhoto) else context.bot.send_video
+        await outbox.send(chat_id, lambda: send(
+            chat_id, item.media, caption=item.caption, reply_markup=None if texts else reply_markup
+        ))
+        if not texts:
+            return
+    elif media:
+        await outbox.send(chat_id, lambda: context.bot.send_media_group(chat_id, media))
+
+    messages = _merge_texts(texts) or ["لتصفح المزيد:" if total_pages > 1 else "🏆"]
+    for i, text in enumerate(messages):
+        markup = reply_markup if i == len(messages) - 1 else None
+        await outbox.send(chat_id, lambda text=text, markup=markup: context.bot.send_message(
+            chat_id, text, reply_markup=markup
+        ))
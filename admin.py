@@ -1,16 +1,16 @@
 # admin.py
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from database import (
-    get_courses, delete_course, add_course, add_video,
-    get_all_users_ids, set_user_blocked, set_user_exempt,
-    is_invite_system_enabled, set_setting,
-    add_achievement, delete_achievement, get_achievements,
-    add_article, delete_article, get_articles
-)
+import async_db as db
+import broadcast
+import cache
+import metrics
+import outbox
+import time
 from config import ADMIN_IDS, CHANNEL_ID
+import config
 import logging
-import asyncio
+import sqlite3
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +18,14 @@ logger = logging.getLogger(__name__)
 COURSE_NAME, RECEIVE_VIDEOS = range(2)
 ACHIEVEMENT_TYPE, ACHIEVEMENT_CONTENT, ACHIEVEMENT_CAPTION = range(2, 5)
 ARTICLE_TITLE, ARTICLE_CONTENT = range(5, 7)
+COURSE_RENAME = 7
+
+# كل ردود لوحة الأدمن تمر عبر outbox مثل بقية الوحدات
+async def _reply(update: Update, text: str, **kwargs):
+    return await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(text, **kwargs))
+
+async def _edit(query, text: str, **kwargs):
+    return await outbox.edit(query.message.chat_id, lambda: query.edit_message_text(text, **kwargs))
 
 # ------------------------------------------------
 # لوحة الأدمن الرئيسية
@@ -25,11 +33,12 @@ ARTICLE_TITLE, ARTICLE_CONTENT = range(5, 7)
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in ADMIN_IDS:
-        await update.message.reply_text("⛔ هذا الأمر مخصص للمشرفين فقط.")
+        await _reply(update, "⛔ هذا الأمر مخصص للمشرفين فقط.")
         return
 
-    invite_status = "مفعل" if is_invite_system_enabled() else "معطل"
-    toggle_text = "🔄 تعطيل نظام الدعوات" if is_invite_system_enabled() else "🔄 تفعيل نظام الدعوات"
+    invite_enabled = await db.is_invite_system_enabled()
+    invite_status = "مفعل" if invite_enabled else "معطل"
+    toggle_text = "🔄 تعطيل نظام الدعوات" if invite_enabled else "🔄 تفعيل نظام الدعوات"
 
     keyboard = [
         [InlineKeyboardButton("➕ كورس جديد", callback_data="admin_new_course")],
@@ -37,45 +46,182 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("🏆 إضافة إنجاز", callback_data="admin_new_achievement")],
         [InlineKeyboardButton("📝 إضافة مقال (المداد)", callback_data="admin_new_article")],
         [InlineKeyboardButton("📢 إذاعة", callback_data="admin_broadcast")],
+        [InlineKeyboardButton("📊 الإحصائيات", callback_data="admin_stats")],
+        [InlineKeyboardButton("🔗 الدعوات", callback_data="admin_referrals")],
         [InlineKeyboardButton("🚫 حظر عضو", callback_data="admin_ban_user")],
         [InlineKeyboardButton("🆓 عفو من الرابط", callback_data="admin_exempt_user")],
         [InlineKeyboardButton(toggle_text, callback_data="admin_toggle_invite")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(f"لوحة التحكم (نظام الدعوات: {invite_status}):", reply_markup=reply_markup)
+    await _reply(update, f"لوحة التحكم (نظام الدعوات: {invite_status}):", reply_markup=reply_markup)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ملخص القياسات للأدمن: أبطأ المعالجات والاستعلامات، طلبات Bot API، والذواكر."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await _reply(update, "⛔ هذا الأمر مخصص للمشرفين فقط.")
+        return
+
+    minutes = max((time.time() - metrics.STARTED_AT) / 60, 1 / 60)
+    lines = [f"📈 القياسات (منذ {int(minutes)} دقيقة)", "", "⏱ أبطأ المعالجات (p95 / المتوسط / العدد):"]
+
+    def top(histogram, limit=5):
+        rows = sorted(histogram.summary().items(), key=lambda kv: kv[1]['p95'], reverse=True)[:limit]
+        return [
+            f"• {' '.join(str(v) for _, v in key)}: {s['p95'] * 1000:.0f}ms / {s['mean'] * 1000:.1f}ms / {s['count']}"
+            for key, s in rows
+        ]
+
+    lines += top(metrics.HANDLER_LATENCY) or ["—"]
+    lines += ["", "🗄 أبطأ استعلامات قاعدة البيانات:"] + (top(metrics.DB_QUERY_LATENCY) or ["—"])
+
+    lines += ["", "📡 طلبات Bot API (في الدقيقة):"]
+    calls = sorted(metrics.API_CALLS.values.items(), key=lambda kv: kv[1], reverse=True)[:6]
+    lines += [f"• {dict(key)['method']}: {value / minutes:.1f}" for key, value in calls] or ["—"]
+    errors = sorted(metrics.API_ERRORS.values.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    if errors:
+        lines += ["", "⚠️ أخطاء Bot API:"]
+        lines += [f"• {dict(key)['method']} {dict(key)['error']}: {int(value)}" for key, value in errors]
+
+    lines += ["", "🧠 الذواكر (نسبة الإصابة / الحجم):"]
+    lines += [f"• {name}: {s['hit_ratio']:.0%} / {s['size']}" for name, s in cache.all_stats().items()]
+    await _reply(update, "\n".join(lines))
+
+def _display_name(user: dict) -> str:
+    return f"@{user['username']}" if user['username'] else (user['first_name'] or str(user['user_id']))
+
+def _format_admin_stats(stats: dict) -> str:
+    users = stats.get('users', 0)
+    courses = stats.get('courses', 0)
+    lines = [
+        "📊 الإحصائيات",
+        "",
+        f"👥 المستخدمون: {users}",
+        f"✅ المشتركون في القناة: {stats.get('subscribed', 0)}",
+        f"🚫 المحظورون: {stats.get('blocked', 0)}",
+        f"📵 حظروا البوت: {stats.get('bot_blocked', 0)}",
+        f"🆓 المعفيون من الدعوات: {stats.get('exempt', 0)}",
+        f"🎯 أكملوا {db.INVITES_REQUIRED} دعوات: {stats.get('invited', 0)}",
+        "",
+        f"📚 الكورسات: {courses} ({stats.get('videos', 0)} فيديو، "
+        f"بمعدل {stats.get('videos', 0) / courses if courses else 0:.1f} لكل كورس)",
+    ]
+    if stats['top_referrers']:
+        lines += ["", "🏅 أكثر الداعين:"]
+        for user in stats['top_referrers']:
+            lines.append(f"• {_display_name(user)}: {user['invites_count']}")
+    if stats['top_courses']:
+        lines += ["", "🎬 أكبر الكورسات:"]
+        lines += [f"• {c['name']}: {c['videos_count']} فيديو" for c in stats['top_courses']]
+    return "\n".join(lines)
+
+# ------------------------------------------------
+# مستكشف الدعوات
+# ------------------------------------------------
+async def _referral_leaderboard():
+    leaders = await db.get_top_referrers(config.REFERRAL_LEADERBOARD_SIZE)
+    lines = ["🔗 لوحة صدارة الداعين:", ""]
+    keyboard = []
+    for i, user in enumerate(leaders, start=1):
+        lines.append(f"{i}. {_display_name(user)} ({user['user_id']}): {user['invites_count']}")
+        keyboard.append([InlineKeyboardButton(
+            f"{i}. {_display_name(user)}", callback_data=f"admin_ref_{user['user_id']}_0"
+        )])
+    if not leaders:
+        lines.append("لا توجد دعوات بعد.")
+    keyboard.append([InlineKeyboardButton("⚠️ نشاط مشبوه", callback_data="admin_ref_bursts")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def _referral_invitees(referrer_id: int, page: int):
+    summary = await db.get_referral_summary(referrer_id)
+    per_page = config.REFERRALS_PER_PAGE
+    total_pages = max(1, (summary['invited'] + per_page - 1) // per_page)
+    page = max(0, min(page, total_pages - 1))
+    invitees = await db.get_invitees_page(referrer_id, page * per_page, per_page)
+
+    lines = [
+        f"👤 مدعوو {referrer_id}: {summary['invited']} (المشتركون: {summary['subscribed']})",
+        f"صفحة {page + 1}/{total_pages}",
+        "",
+    ]
+    for user in invitees:
+        status = "✅" if user['is_subscribed'] else "❌"
+        lines.append(f"{status} {_display_name(user)} ({user['user_id']}) — {user['referred_at'] or '—'}")
+
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"admin_ref_{referrer_id}_{page - 1}"))
+    if page < total_pages - 1:
+        nav_row.append(InlineKeyboardButton("التالي ➡️", callback_data=f"admin_ref_{referrer_id}_{page + 1}"))
+    keyboard = [nav_row] if nav_row else []
+    keyboard.append([InlineKeyboardButton("🔙 لوحة الصدارة", callback_data="admin_referrals")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def _referral_bursts():
+    window = config.REFERRAL_BURST_WINDOW
+    bursts = await db.get_referral_bursts(window, config.REFERRAL_BURST_THRESHOLD)
+    lines = [f"⚠️ داعون بـ {config.REFERRAL_BURST_THRESHOLD}+ مدعو خلال آخر {window // 60} دقيقة:", ""]
+    keyboard = []
+    for burst in bursts:
+        lines.append(
+            f"• {burst['referrer_id']}: {burst['invited']} مدعو، المشتركون {burst['subscribed']} "
+            f"({burst['first_at']} ← {burst['last_at']})"
+        )
+        keyboard.append([InlineKeyboardButton(
+            f"🔎 {burst['referrer_id']}", callback_data=f"admin_ref_{burst['referrer_id']}_0"
+        )])
+    if not bursts:
+        lines.append("لا يوجد نشاط مشبوه.")
+    keyboard.append([InlineKeyboardButton("🔙 لوحة الصدارة", callback_data="admin_referrals")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def referrals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/referrals للوحة الصدارة، أو /referrals <user_id> لمدعوي مستخدم معين."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await _reply(update, "⛔ هذا الأمر مخصص للمشرفين فقط.")
+        return
+    if context.args:
+        try:
+            referrer_id = int(context.args[0])
+        except ValueError:
+            await _reply(update, "❌ معرف غير صالح.")
+            return
+        text, reply_markup = await _referral_invitees(referrer_id, 0)
+    else:
+        text, reply_markup = await _referral_leaderboard()
+    await _reply(update, text, reply_markup=reply_markup)
 
 async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
     if user_id not in ADMIN_IDS:
-        await query.edit_message_text("غير مصرح.")
+        await _edit(query, "غير مصرح.")
         return
 
     data = query.data
 
     # إضافة كورس جديد
     if data == "admin_new_course":
-        await query.edit_message_text("أرسل اسم الكورس الجديد:")
+        await _edit(query, "أرسل اسم الكورس الجديد:")
         return COURSE_NAME  # سيتم التعامل معها في ConversationHandler
 
     # حذف كورس
     elif data == "admin_delete_course":
-        courses = get_courses()
+        courses = await db.get_courses()
         if not courses:
-            await query.edit_message_text("لا توجد كورسات.")
+            await _edit(query, "لا توجد كورسات.")
             return
         keyboard = []
         for course in courses:
             keyboard.append([InlineKeyboardButton(course['name'], callback_data=f"del_course_{course['id']}")])
         keyboard.append([InlineKeyboardButton("إلغاء", callback_data="admin_cancel")])
-        await query.edit_message_text("اختر الكورس للحذف:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await _edit(query, "اختر الكورس للحذف:", reply_markup=InlineKeyboardMarkup(keyboard))
         return ConversationHandler.END
 
     elif data.startswith("del_course_"):
         course_id = int(data.split("_")[2])
-        delete_course(course_id)
-        await query.edit_message_text("✅ تم حذف الكورس بنجاح.")
+        await db.delete_course(course_id)
+        await _edit(query, "✅ تم حذف الكورس بنجاح.")
 
     # إضافة إنجاز
     elif data == "admin_new_achievement":
@@ -85,42 +231,65 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
             [InlineKeyboardButton("🎥 فيديو", callback_data="achievement_type_video")],
             [InlineKeyboardButton("إلغاء", callback_data="admin_cancel")]
         ]
-        await query.edit_message_text("اختر نوع الإنجاز:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await _edit(query, "اختر نوع الإنجاز:", reply_markup=InlineKeyboardMarkup(keyboard))
         return ConversationHandler.END
 
     # إضافة مقال
     elif data == "admin_new_article":
-        await query.edit_message_text("أرسل عنوان المقال:")
+        await _edit(query, "أرسل عنوان المقال:")
         return ARTICLE_TITLE
 
     # إذاعة
     elif data == "admin_broadcast":
-        await query.edit_message_text("أرسل الرسالة التي تريد إذاعتها لجميع المستخدمين:")
+        await _edit(query, "أرسل الرسالة التي تريد إذاعتها لجميع المستخدمين (نص، صورة، فيديو...):")
         context.user_data['broadcast_mode'] = True
         return ConversationHandler.END
 
+    # الإحصائيات
+    elif data == "admin_stats":
+        stats = await db.get_admin_stats()
+        await _edit(query, _format_admin_stats(stats))
+
+    # مستكشف الدعوات
+    elif data == "admin_referrals":
+        text, reply_markup = await _referral_leaderboard()
+        await _edit(query, text, reply_markup=reply_markup)
+
+    elif data == "admin_ref_bursts":
+        text, reply_markup = await _referral_bursts()
+        await _edit(query, text, reply_markup=reply_markup)
+
+    elif data.startswith("admin_ref_"):
+        _, _, referrer_id, page = data.split("_")
+        text, reply_markup = await _referral_invitees(int(referrer_id), int(page))
+        await _edit(query, text, reply_markup=reply_markup)
+
+    elif data.startswith("admin_broadcast_cancel_"):
+        broadcast_id = int(data.split("_")[3])
+        await broadcast.cancel_broadcast(broadcast_id)
+        await _edit(query, "⛔ تم إيقاف الإذاعة.")
+
     # حظر عضو
     elif data == "admin_ban_user":
-        await query.edit_message_text("أرسل معرف المستخدم (user_id) لحظره:")
+        await _edit(query, "أرسل معرف المستخدم (user_id) لحظره:")
         context.user_data['ban_mode'] = True
         return ConversationHandler.END
 
     # إعفاء
     elif data == "admin_exempt_user":
-        await query.edit_message_text("أرسل معرف المستخدم (user_id) لإعفائه من نظام الدعوات:")
+        await _edit(query, "أرسل معرف المستخدم (user_id) لإعفائه من نظام الدعوات:")
         context.user_data['exempt_mode'] = True
         return ConversationHandler.END
 
     # تبديل نظام الدعوات
     elif data == "admin_toggle_invite":
-        current = is_invite_system_enabled()
-        new_value = 'false' if current else 'true'
-        set_setting('invite_system_enabled', new_value)
+        current = await db.is_invite_system_enabled()
+        await db.set_setting('invite_system_enabled', not current)
         status = "معطل" if current else "مفعل"
-        await query.edit_message_text(f"✅ تم {status} نظام الدعوات.")
+        await _edit(query, f"✅ تم {status} نظام الدعوات.")
 
     elif data == "admin_cancel":
-        await query.edit_message_text("تم الإلغاء.")
+        await _edit(query, "تم الإلغاء.")
         return ConversationHandler.END
 
 # ------------------------------------------------
@@ -129,18 +298,21 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
 async def new_course_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         return ConversationHandler.END
-    await update.message.reply_text("أرسل اسم الكورس الجديد:")
+    await _reply(update, "أرسل اسم الكورس الجديد:")
     return COURSE_NAME
 
 async def new_course_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     course_name = update.message.text.strip()
     if not course_name:
-        await update.message.reply_text("الاسم لا يمكن أن يكون فارغاً. أعد الإرسال:")
+        await _reply(update, "الاسم لا يمكن أن يكون فارغاً. أعد الإرسال:")
+        return COURSE_NAME
+    # التحقق قبل رفع الفيديوهات، لا عند /done بعدها
+    if await db.course_name_exists(course_name):
+        await _reply(update, "❌ يوجد كورس بنفس الاسم. أرسل اسماً آخر:")
         return COURSE_NAME
 
-    context.user_data['new_course_name'] = course_name
-    context.user_data['videos'] = []
-    await update.message.reply_text(
+    await db.start_ingestion(update.effective_user.id, course_name)
+    await _reply(update, 
         "الآن أرسل الفيديوهات واحداً تلو الآخر.\n"
         "عند الانتهاء أرسل /done"
     )
@@ -148,40 +320,66 @@ async def new_course_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def receive_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.video:
-        await update.message.reply_text("الرجاء إرسال فيديو فقط.")
+        await _reply(update, "الرجاء إرسال فيديو فقط.")
         return RECEIVE_VIDEOS
 
     video = update.message.video
     file_id = video.file_id
 
     try:
-        sent_message = await context.bot.send_video(chat_id=CHANNEL_ID, video=file_id)
+        # رفع متتابع إلى القناة: حد الدردشة وإعادة المحاولة عند RetryAfter من outbox
+        sent_message = await outbox.send(CHANNEL_ID, lambda: context.bot.send_video(chat_id=CHANNEL_ID, video=file_id))
         message_id = sent_message.message_id
-        context.user_data['videos'].append({'file_id': file_id, 'message_id': message_id})
-        await update.message.reply_text(f"✅ تم استقبال الفيديو {len(context.user_data['videos'])}. أرسل التالي أو /done للإنهاء.")
+        count = await db.stage_video(update.effective_user.id, file_id, message_id)
+        await _reply(update, f"✅ تم استقبال الفيديو {count}. أرسل التالي أو /done للإنهاء.")
     except Exception as e:
         logger.error(f"Failed to forward video to channel: {e}")
-        await update.message.reply_text("حدث خطأ أثناء حفظ الفيديو، حاول مرة أخرى.")
+        await _reply(update, "حدث خطأ أثناء حفظ الفيديو، حاول مرة أخرى.")
     return RECEIVE_VIDEOS
 
 async def done_adding_videos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         return ConversationHandler.END
 
-    course_name = context.user_data.get('new_course_name')
-    videos = context.user_data.get('videos', [])
+    return await _commit_course(update, update.effective_user.id)
 
-    if not course_name or not videos:
-        await update.message.reply_text("لم يتم إضافة أي فيديوهات. إلغاء العملية.")
+async def rename_course(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """اسم جديد بعد تعارض الاسم عند /done: الفيديوهات المرفوعة تبقى كما هي."""
+    course_name = update.message.text.strip()
+    if not course_name or await db.course_name_exists(course_name):
+        await _reply(update, "❌ الاسم فارغ أو مستخدم. أرسل اسماً آخر (أو /cancel للإلغاء):")
+        return COURSE_RENAME
+    if not await db.rename_ingestion(update.effective_user.id, course_name):
+        await _reply(update, "انتهت عملية الإضافة. ابدأ من جديد.")
+        return ConversationHandler.END
+    return await _commit_course(update, update.effective_user.id)
+
+async def _commit_course(update: Update, admin_id: int):
+    try:
+        result = await db.commit_ingestion(admin_id)
+    except sqlite3.IntegrityError:
+        # أُضيف كورس بنفس الاسم أثناء الرفع
+        await _reply(update, 
+            "❌ يوجد كورس بنفس الاسم. أرسل اسماً جديداً للكورس، والفيديوهات المرفوعة محفوظة:"
+        )
+        return COURSE_RENAME
+
+    if not result:
+        await db.cancel_ingestion(admin_id)
+        await _reply(update, "لم يتم إضافة أي فيديوهات. إلغاء العملية.")
         return ConversationHandler.END
 
-    course_id = add_course(course_name)
-    for idx, vid in enumerate(videos, start=1):
-        add_video(course_id, vid['file_id'], vid['message_id'], idx)
+    await _reply(update, f"✅ تم إضافة الكورس '{result['course_name']}' مع {result['videos']} فيديو.")
+    return ConversationHandler.END
+
+async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/cancel لمحادثات الإنجازات والمقالات."""
+    await _reply(update, "تم الإلغاء.")
+    return ConversationHandler.END
 
-    await update.message.reply_text(f"✅ تم إضافة الكورس '{course_name}' مع {len(videos)} فيديو.")
-    context.user_data.pop('new_course_name', None)
-    context.user_data.pop('videos', None)
+async def cancel_adding_course(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await db.cancel_ingestion(update.effective_user.id)
+    await _reply(update, "تم الإلغاء.")
     return ConversationHandler.END
 
 # ------------------------------------------------
@@ -194,15 +392,15 @@ async def achievement_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data == "achievement_type_text":
         context.user_data['achievement_type'] = 'text'
-        await query.edit_message_text("أرسل النص الذي تريد عرضه في الإنجاز:")
+        await _edit(query, "أرسل النص الذي تريد عرضه في الإنجاز:")
         return ACHIEVEMENT_CONTENT
     elif data == "achievement_type_photo":
         context.user_data['achievement_type'] = 'photo'
-        await query.edit_message_text("أرسل الصورة (كصورة وليس ملف):")
+        await _edit(query, "أرسل الصورة (كصورة وليس ملف):")
         return ACHIEVEMENT_CONTENT
     elif data == "achievement_type_video":
         context.user_data['achievement_type'] = 'video'
-        await query.edit_message_text("أرسل الفيديو (كفيديو وليس ملف):")
+        await _edit(query, "أرسل الفيديو (كفيديو وليس ملف):")
         return ACHIEVEMENT_CONTENT
     else:
         return ConversationHandler.END
@@ -212,26 +410,26 @@ async def achievement_content(update: Update, context: ContextTypes.DEFAULT_TYPE
     if atype == 'text':
         content = update.message.text
         if not content:
-            await update.message.reply_text("الرجاء إرسال نص غير فارغ.")
+            await _reply(update, "الرجاء إرسال نص غير فارغ.")
             return ACHIEVEMENT_CONTENT
         context.user_data['achievement_content'] = content
-        await update.message.reply_text("أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
+        await _reply(update, "أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
         return ACHIEVEMENT_CAPTION
     elif atype == 'photo':
         if not update.message.photo:
-            await update.message.reply_text("الرجاء إرسال صورة.")
+            await _reply(update, "الرجاء إرسال صورة.")
             return ACHIEVEMENT_CONTENT
         file_id = update.message.photo[-1].file_id
         context.user_data['achievement_content'] = file_id
-        await update.message.reply_text("أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
+        await _reply(update, "أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
         return ACHIEVEMENT_CAPTION
     elif atype == 'video':
         if not update.message.video:
-            await update.message.reply_text("الرجاء إرسال فيديو.")
+            await _reply(update, "الرجاء إرسال فيديو.")
             return ACHIEVEMENT_CONTENT
         file_id = update.message.video.file_id
         context.user_data['achievement_content'] = file_id
-        await update.message.reply_text("أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
+        await _reply(update, "أرسل التعليق (اختياري، أو أرسل /skip لتخطي):")
         return ACHIEVEMENT_CAPTION
     else:
         return ConversationHandler.END
@@ -244,8 +442,8 @@ async def achievement_caption(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     atype = context.user_data['achievement_type']
     content = context.user_data['achievement_content']
-    add_achievement(atype, content, caption)
-    await update.message.reply_text("✅ تم إضافة الإنجاز بنجاح.")
+    await db.add_achievement(atype, content, caption)
+    await _reply(update, "✅ تم إضافة الإنجاز بنجاح.")
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -258,55 +456,47 @@ async def skip_caption(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def article_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     title = update.message.text.strip()
     if not title:
-        await update.message.reply_text("الرجاء إدخال عنوان غير فارغ.")
+        await _reply(update, "الرجاء إدخال عنوان غير فارغ.")
         return ARTICLE_TITLE
     context.user_data['article_title'] = title
-    await update.message.reply_text("أرسل محتوى المقال (نص طويل):")
+    await _reply(update, "أرسل محتوى المقال (نص طويل):")
     return ARTICLE_CONTENT
 
 async def article_content(update: Update, context: ContextTypes.DEFAULT_TYPE):
     content = update.message.text.strip()
     if not content:
-        await update.message.reply_text("الرجاء إدخال محتوى غير فارغ.")
+        await _reply(update, "الرجاء إدخال محتوى غير فارغ.")
         return ARTICLE_CONTENT
     title = context.user_data['article_title']
-    add_article(title, content)
-    await update.message.reply_text("✅ تم إضافة المقال بنجاح.")
+    await db.add_article(title, content)
+    await _reply(update, "✅ تم إضافة المقال بنجاح.")
     context.user_data.clear()
     return ConversationHandler.END
 
 # ------------------------------------------------
-# معالجة النصوص للأدمن (إذاعة، حظر، إعفاء)
+# معالجة رسائل الأدمن (إذاعة، حظر، إعفاء)
 # ------------------------------------------------
 async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_IDS:
         return
 
-    text = update.message.text
+    text = update.message.text or ""
 
-    # إذاعة
+    # إذاعة: تُنسخ رسالة الأدمن كما هي (مع التنسيق والوسائط) وتعمل في الخلفية
     if context.user_data.get('broadcast_mode'):
-        users = get_all_users_ids()
-        success = failed = 0
-        for uid in users:
-            try:
-                await context.bot.send_message(chat_id=uid, text=text)
-                success += 1
-            except Exception:
-                failed += 1
-            await asyncio.sleep(0.05)
-        await update.message.reply_text(f"✅ تمت الإذاعة.\nنجح: {success}\nفشل: {failed}")
         context.user_data['broadcast_mode'] = False
+        await broadcast.start_broadcast(context.bot, update.effective_user.id, update.message)
+        await _reply(update, "📢 بدأت الإذاعة، سيتم عرض التقدم هنا.")
         return
 
     # حظر
     if context.user_data.get('ban_mode'):
         try:
             target_id = int(text.strip())
-            set_user_blocked(target_id, True)
-            await update.message.reply_text(f"✅ تم حظر المستخدم {target_id}.")
+            await db.set_user_blocked(target_id, True)
+            await _reply(update, f"✅ تم حظر المستخدم {target_id}.")
         except:
-            await update.message.reply_text("❌ معرف غير صالح.")
+            await _reply(update, "❌ معرف غير صالح.")
         context.user_data['ban_mode'] = False
         return
 
@@ -314,9 +504,9 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get('exempt_mode'):
         try:
             target_id = int(text.strip())
-            set_user_exempt(target_id, True)
-            await update.message.reply_text(f"✅ تم إعفاء المستخدم {target_id} من نظام الدعوات.")
+            await db.set_user_exempt(target_id, True)
+            await _reply(update, f"✅ تم إعفاء المستخدم {target_id} من نظام الدعوات.")
         except:
-            await update.message.reply_text("❌ معرف غير صالح.")
+            await _reply(update, "❌ معرف غير صالح.")
         context.user_data['exempt_mode'] = False
         return
@@ -0,0 +1,121 @@
+# antiflood.py
+# حماية من الضغط المتكرر: دلو رموز لكل مستخدم، ودمج ضغطات الزر نفسه (نفس callback_data)
+# التي تصل والضغطة السابقة ما زالت قيد المعالجة. يعمل كمعالج في مجموعة سالبة قبل كل المعالجات،
+# والتحديث المرفوض يُوقف بـ ApplicationHandlerStop فلا يصل إلى is_user_qualified ولا قاعدة البيانات.
+# الاستعلامات المضمّنة (@bot) لها دلو مستقل أكبر: كل حرف يكتبه المستخدم استعلام جديد.
+import logging
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from metrics import FLOOD_REJECTED
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class AntiFlood:
+    def __init__(self, rate: float, burst: float, max_users: int, exempt_ids=(),
+                 inline_rate: float = None, inline_burst: float = None):
+        self.rate = rate
+        self.burst = burst
+        self.inline_rate = inline_rate or rate
+        self.inline_burst = inline_burst or burst
+        self.max_users = max_users
+        self.exempt_ids = set(exempt_ids)
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._inline_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._in_flight: Dict[Tuple[int, str], int] = {}  # (user, callback_data) -> update_id الأصلي
+        self._duplicates = set()                          # update_id لضغطات مكررة بانتظار دورها
+
+    # --- يُستدعى من PerUserUpdateProcessor عند وصول التحديث وعند انتهائه ---
+    @staticmethod
+    def _callback_key(update: object):
+        if isinstance(update, Update) and update.callback_query and update.callback_query.data:
+            return update.callback_query.from_user.id, update.callback_query.data
+        return None
+
+    def update_received(self, update: object):
+        key = self._callback_key(update)
+        if key is None:
+            return
+        if key in self._in_flight:
+            self._duplicates.add(update.update_id)
+        else:
+            self._in_flight[key] = update.update_id
+
+    def update_done(self, update: object):
+        key = self._callback_key(update)
+        if key is None:
+            return
+        if self._in_flight.get(key) == update.update_id:
+            del self._in_flight[key]
+        else:
+            self._duplicates.discard(update.update_id)
+
+    # --- المعالج (المجموعة -1) ---
+    def _bucket(self, buckets: OrderedDict, user_id: int, rate: float, burst: float) -> TokenBucket:
+        bucket = buckets.get(user_id)
+        if bucket is None:
+            bucket = buckets[user_id] = TokenBucket(rate, burst)
+            while len(buckets) > self.max_users:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(user_id)
+        return bucket
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not (update.message or update.callback_query or update.inline_query):
+            return
+        user = update.effective_user
+        if user is None or user.id in self.exempt_ids:
+            return
+        query = update.callback_query
+
+        if update.update_id in self._duplicates:
+            FLOOD_REJECTED.inc(reason='duplicate')
+            await self._answer(query)  # إيقاف مؤشر التحميل فقط، الضغطة الأولى ستعرض النتيجة
+            raise ApplicationHandlerStop
+
+        if update.inline_query:
+            if not self._bucket(self._inline_buckets, user.id, self.inline_rate, self.inline_burst).try_acquire():
+                FLOOD_REJECTED.inc(reason='inline')
+                await self._answer_inline(update.inline_query)
+                raise ApplicationHandlerStop
+            return
+
+        if not self._bucket(self._buckets, user.id, self.rate, self.burst).try_acquire():
+            FLOOD_REJECTED.inc(reason='rate')
+            if query:
+                await self._answer(query, "⏳ تمهّل قليلاً...")
+            raise ApplicationHandlerStop
+
+    @staticmethod
+    async def _answer(query, text: str = None):
+        if query is None:
+            return
+        try:
+            await query.answer(text)
+        except TelegramError as e:
+            logger.debug(f"Failed to answer throttled callback: {e}")
+
+    @staticmethod
+    async def _answer_inline(inline_query):
+        # نتيجة فارغة غير مخزنة بدل ترك الاستعلام معلقاً؛ الحرف التالي يعيد البحث
+        try:
+            await inline_query.answer([], cache_time=0)
+        except TelegramError as e:
+            logger.debug(f"Failed to answer throttled inline query: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'inline_rate': self.inline_rate,
+            'inline_burst': self.inline_burst,
+            'tracked_users': len(self._buckets),
+            'tracked_inline_users': len(self._inline_buckets),
+            'callbacks_in_flight': len(self._in_flight),
+        }
@@ -0,0 +1,48 @@
+# arabic.py
+# توحيد النص العربي قبل الفهرسة والبحث: حذف التشكيل والتطويل وتوحيد أشكال الألف والياء والتاء المربوطة،
+# حتى يطابق "الإسلام" و"الاسلام" و"الإسْلام" بعضها.
+import re
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')  # التشكيل + التطويل
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و', 'ئ': 'ي',
+})
+
+def normalize(text: str) -> str:
+    if not text:
+        return ""
+    return _DIACRITICS.sub('', text).translate(_LETTERS).casefold()
+
+def tokens(text: str) -> list:
+    """كلمات النص بعد التوحيد (حروف وأرقام فقط)."""
+    return re.findall(r'\w+', normalize(text))
+
+# كلمة في النص الأصلي: حروف وأرقام مع ما بينها من تشكيل وتطويل (حتى لا تنقسم "الإسْلام" إلى كلمتين)
+_WORD = re.compile(r'[\w\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]+')
+
+def snippet(text: str, terms: list, size: int = 16, start: str = '«', end: str = '»', ellipsis: str = '…') -> str:
+    """مقتطف من النص الأصلي (بتشكيله وإملائه) حول أول كلمة تطابق بادئة من terms بعد التوحيد،
+    بحد أقصى size كلمة، والكلمات المطابقة بين start و end."""
+    words = list(_WORD.finditer(text))
+    if not words:
+        return ""
+    matched = [any(normalize(w.group()).startswith(term) for term in terms) for w in words]
+    first = matched.index(True) if True in matched else 0
+    lo = max(0, min(first - size // 4, len(words) - size))
+    hi = min(len(words), lo + size)
+    parts = []
+    pos = words[lo].start()
+    for i in range(lo, hi):
+        w = words[i]
+        parts.append(text[pos:w.start()])
+        parts.append(f"{start}{w.group()}{end}" if matched[i] else w.group())
+        pos = w.end()
+    result = ' '.join(''.join(parts).split())  # أسطر المقال تُعرض كسطر واحد
+    if lo > 0:
+        result = ellipsis + result
+    if hi < len(words):
+        result += ellipsis
+    return result
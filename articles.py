@@ -1,37 +1,119 @@
 # articles.py
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
-from database import get_articles
-from keyboards import articles_navigation_keyboard, back_to_main_button
+import async_db as db
+import outbox
+from keyboards import articles_navigation_keyboard, article_parts_keyboard, back_to_main_button
+import config
 import logging
 
 logger = logging.getLogger(__name__)
 
+async def _show_chunk(update: Update, text: str, reply_markup, edit: bool):
+    """الأجزاء مُهرّبة مسبقاً بصيغة HTML عند حفظ المقال، فتُرسل كما هي."""
+    if edit:
+        await outbox.edit(update.effective_chat.id, lambda: update.callback_query.edit_message_text(
+            text, parse_mode=ParseMode.HTML, reply_markup=reply_markup))
+    else:
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            text, parse_mode=ParseMode.HTML, reply_markup=reply_markup))
+
 async def show_articles(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
-    articles = get_articles()
-    if not articles:
-        await update.effective_message.reply_text(
+    query = update.callback_query
+    chunk = 0
+    if query and query.data.startswith("articles_page_"):
+        await query.answer()
+        # articles_page_<مقال> أو articles_page_<مقال>_<جزء>
+        parts = query.data.split("_")
+        page = int(parts[2])
+        chunk = int(parts[3]) if len(parts) > 3 else 0
+
+    total = await db.count_articles()
+    if not total:
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
             "لا توجد مقالات بعد.",
             reply_markup=back_to_main_button()
-        )
+        ))
         return
 
-    per_page = 1  # مقالة واحدة في كل صفحة
-    total_pages = (len(articles) + per_page - 1) // per_page
-    start = page * per_page
-    end = start + per_page
-    current = articles[start:end]
-
-    for art in current:
-        text = f"📖 *{art['title']}*\n\n{art['content']}"
-        await update.effective_message.reply_text(
-            text,
-            parse_mode='Markdown',
-            reply_markup=back_to_main_button() if art == current[-1] and total_pages <= 1 else None
-        )
+    page = max(0, min(page, total - 1))  # مقالة واحدة في كل صفحة
+    art = await db.get_article_chunk_at(page, chunk)
+    if not art and chunk:
+        # تغيّر المقال (أُعيد تقسيمه) منذ عرض الأزرار
+        chunk = 0
+        art = await db.get_article_chunk_at(page, chunk)
+    if not art:
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "تعذر عرض المقال.", reply_markup=back_to_main_button()))
+        return
+
+    reply_markup = articles_navigation_keyboard(page, total, chunk, art['chunks_count'])
+    # الرسالة السابقة نصية (القائمة أو مقال سابق): تُعدّل في مكانها
+    await _show_chunk(update, art['text'], reply_markup, edit=bool(query and query.message.text))
+
+# ------------------------------------------------
+# البحث في المقالات
+# ------------------------------------------------
+async def _search_results(search: str, page: int):
+    per_page = config.SEARCH_RESULTS_PER_PAGE
+    found = await db.search_articles(search, page * per_page, per_page)
+    total = found['total']
+    if not total:
+        return f"🔎 لا توجد نتائج لـ «{search}».", back_to_main_button()
 
-    if total_pages > 1:
-        await update.effective_message.reply_text(
-            "لتصفح المزيد:",
-            reply_markup=articles_navigation_keyboard(page, total_pages)
+    total_pages = (total + per_page - 1) // per_page
+    lines = [f"🔎 نتائج «{search}»: {total} (صفحة {page + 1}/{total_pages})", ""]
+    keyboard = []
+    for i, hit in enumerate(found['results'], start=page * per_page + 1):
+        lines.append(f"{i}. 📖 {hit['title']}\n{hit['snippet']}\n")
+        keyboard.append([InlineKeyboardButton(f"{i}. {hit['title']}"[:64], callback_data=f"article_open_{hit['id']}")])
+
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"search_page_{page - 1}"))
+    if page < total_pages - 1:
+        nav_row.append(InlineKeyboardButton("التالي ➡️", callback_data=f"search_page_{page + 1}"))
+    if nav_row:
+        keyboard.append(nav_row)
+    keyboard.append([InlineKeyboardButton("🏠 القائمة الرئيسية", callback_data="back_to_main")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <كلمات>: البحث في عناوين ومحتوى المقالات."""
+    search = " ".join(context.args).strip()
+    if not search:
+        await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(
+            "اكتب كلمات البحث بعد الأمر، مثال:\n/search التاريخ الإسلامي"))
+        return
+    context.user_data['article_search'] = search
+    text, reply_markup = await _search_results(search, 0)
+    await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(text, reply_markup=reply_markup))
+
+async def search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    data = query.data
+
+    if data.startswith("article_open_"):
+        # article_open_<id> من نتائج البحث (رسالة جديدة)، أو article_open_<id>_<جزء> للتنقل داخل المقال
+        parts = data.split("_")
+        article_id = int(parts[2])
+        chunk = int(parts[3]) if len(parts) > 3 else 0
+        art = await db.get_article_chunk(article_id, chunk)
+        if not art:
+            await outbox.send(update.effective_chat.id, lambda: query.message.reply_text("هذا المقال لم يعد موجوداً."))
+            return
+        await _show_chunk(
+            update, art['text'], article_parts_keyboard(article_id, chunk, art['chunks_count']),
+            edit=len(parts) > 3
         )
+
+    elif data.startswith("search_page_"):
+        search = context.user_data.get('article_search')
+        if not search:
+            await outbox.edit(update.effective_chat.id, lambda: query.edit_message_text(
+                "انتهت صلاحية البحث، أعد إرسال /search."))
+            return
+        text, reply_markup = await _search_results(search, int(data.split("_")[2]))
+        await outbox.edit(update.effective_chat.id, lambda: query.edit_message_text(text, reply_markup=reply_markup))
@@ -0,0 +1,156 @@
+# async_db.py
+# نسخة غير متزامنة من واجهة database.py حتى لا تُوقف استعلامات SQLite حلقة الأحداث.
+# القراءات تُنفّذ على مجموعة خيوط قراءة، والكتابات على خيط كتابة واحد مخصص
+# (SQLite يسمح بكاتب واحد فقط)، فلا يؤخر commit أو fsync بطيء القراءات الأخرى.
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from metrics import DB_QUERY_LATENCY, DB_QUEUE_WAIT
+
+READER_THREADS = 2
+QUEUE_SIZE = 256  # الحد الأقصى للعمليات المعلّقة لكل منفذ
+
+class _Executor:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = None  # يُنشأ داخل حلقة الأحداث
+
+    async def run(self, func, *args, **kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(QUEUE_SIZE)
+        # طابور محدود: عند امتلائه ينتظر المستدعي دون حجب الحلقة
+        async with self._slots:
+            queued = time.perf_counter()
+
+            def call():
+                started = time.perf_counter()
+                DB_QUEUE_WAIT.observe(started - queued, executor=self.name)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    DB_QUERY_LATENCY.observe(time.perf_counter() - started, function=func.__name__)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, call)
+
+    def shutdown(self):
+        # انتظار انتهاء العمليات المعلّقة (خاصة الكتابات) قبل الخروج
+        self._pool.shutdown(wait=True)
+
+_reader = _Executor('db-reader', READER_THREADS)
+_writer = _Executor('db-writer', 1)
+
+def _read(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await _reader.run(func, *args, **kwargs)
+    return wrapper
+
+def _write(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await _writer.run(func, *args, **kwargs)
+    return wrapper
+
+def shutdown():
+    _reader.shutdown()
+    _writer.shutdown()
+
+# --- دوال المستخدمين ---
+get_user = _read(database.get_user)
+get_all_users_ids = _read(database.get_all_users_ids)
+add_or_update_user = _write(database.add_or_update_user)
+queue_user_profile = _write(database.queue_user_profile)
+flush_pending_users = _write(database.flush_pending_users)
+set_user_blocked = _write(database.set_user_blocked)
+set_user_exempt = _write(database.set_user_exempt)
+set_user_subscribed = _write(database.set_user_subscribed)
+increment_invites = _write(database.increment_invites)
+set_referrer = _write(database.set_referrer)
+set_invite_message_shown = _write(database.set_invite_message_shown)
+mark_invite_rewarded = _write(database.mark_invite_rewarded)
+set_user_bot_blocked = _write(database.set_user_bot_blocked)
+
+# --- دوال الكورسات والفيديوهات ---
+get_courses = _read(database.get_courses)
+get_courses_page = _read(database.get_courses_page)
+count_courses = _read(database.count_courses)
+search_courses = _read(database.search_courses)
+get_course = _read(database.get_course)
+get_videos = _read(database.get_videos)
+get_video_at = _read(database.get_video_at)
+add_course = _write(database.add_course)
+delete_course = _write(database.delete_course)
+add_video = _write(database.add_video)
+import_courses = _write(database.import_courses)
+course_name_exists = _read(database.course_name_exists)
+start_ingestion = _write(database.start_ingestion)
+rename_ingestion = _write(database.rename_ingestion)
+stage_video = _write(database.stage_video)
+get_ingestion = _read(database.get_ingestion)
+commit_ingestion = _write(database.commit_ingestion)
+cancel_ingestion = _write(database.cancel_ingestion)
+
+# --- دوال معرض الإنجازات ---
+get_achievements = _read(database.get_achievements)
+get_achievements_page = _read(database.get_achievements_page)
+count_achievements = _read(database.count_achievements)
+add_achievement = _write(database.add_achievement)
+delete_achievement = _write(database.delete_achievement)
+
+# --- دوال المداد (مقالات) ---
+get_articles = _read(database.get_articles)
+get_articles_page = _read(database.get_articles_page)
+count_articles = _read(database.count_articles)
+get_article_chunk = _read(database.get_article_chunk)
+get_article_chunk_at = _read(database.get_article_chunk_at)
+search_articles = _read(database.search_articles)
+add_article = _write(database.add_article)
+update_article = _write(database.update_article)
+delete_article = _write(database.delete_article)
+
+# --- دوال الإذاعة ---
+count_broadcast_recipients = _read(database.count_broadcast_recipients)
+get_broadcast_recipients = _read(database.get_broadcast_recipients)
+get_broadcast = _read(database.get_broadcast)
+get_running_broadcasts = _read(database.get_running_broadcasts)
+create_broadcast = _write(database.create_broadcast)
+set_broadcast_progress_message = _write(database.set_broadcast_progress_message)
+update_broadcast_progress = _write(database.update_broadcast_progress)
+finish_broadcast = _write(database.finish_broadcast)
+
+# --- حالة المستخدمين والمحادثات ---
+get_user_state = _read(database.get_user_state)
+get_conversation_states = _read(database.get_conversation_states)
+save_states = _write(database.save_states)
+
+# --- إحصائيات الأدمن ---
+INVITES_REQUIRED = database.INVITES_REQUIRED
+get_admin_stats = _read(database.get_admin_stats)
+reconcile_stats = _write(database.reconcile_stats)
+
+# --- شجرة الدعوات ---
+get_top_referrers = _read(database.get_top_referrers)
+get_referral_summary = _read(database.get_referral_summary)
+get_invitees_page = _read(database.get_invitees_page)
+get_referral_bursts = _read(database.get_referral_bursts)
+
+# --- دوال الإعدادات ---
+# القراءة من الذاكرة مباشرة (لا حاجة لخيط قاعدة البيانات)
+async def get_setting(key: str, default: str = None) -> str:
+    return database.get_setting(key, default)
+
+async def get_setting_bool(key: str) -> bool:
+    return database.get_setting_bool(key)
+
+async def get_setting_int(key: str) -> int:
+    return database.get_setting_int(key)
+
+async def is_invite_system_enabled() -> bool:
+    return database.is_invite_system_enabled()
+
+set_setting = _write(database.set_setting)
@@ -0,0 +1,63 @@
+# benchmarks/bench_connection.py
+# مقارنة المسار القديم (اتصال جديد لكل استدعاء) بالاتصال الدائم الجديد.
+# التشغيل: python benchmarks/bench_connection.py [عدد_التكرارات]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+def old_get_user(user_id: int):
+    # نسخة طبق الأصل من get_db القديمة: connect/close في كل استدعاء
+    conn = sqlite3.connect(database.DATABASE)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def old_add_or_update_user(user_id: int, username: str):
+    conn = sqlite3.connect(database.DATABASE)
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        if cur.fetchone():
+            cur.execute('UPDATE users SET username = ? WHERE user_id = ?', (username, user_id))
+        else:
+            cur.execute('INSERT INTO users (user_id, username) VALUES (?, ?)', (user_id, username))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bench(label: str, func, n: int):
+    start = time.perf_counter()
+    for i in range(n):
+        func(i % 1000)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {n / elapsed:>10.0f} ops/s  {elapsed / n * 1e6:>8.1f} µs/op")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        for uid in range(1000):
+            database.add_or_update_user(uid, f"user{uid}")
+
+        bench("get_user (old: connect/close)", old_get_user, n)
+        bench("get_user (persistent)", database.get_user, n)
+        bench("add_or_update (old)", lambda uid: old_add_or_update_user(uid, "x"), n)
+        bench("add_or_update (persistent)", lambda uid: database.add_or_update_user(uid, "x"), n)
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmarks/bench_database.py
+# قياس أداء database.py على قاعدة بيانات مؤقتة بحجم الإنتاج.
+#
+# التشغيل:
+#   python benchmarks/bench_database.py                       # الحجم الكامل (1M مستخدم...)
+#   python benchmarks/bench_database.py --scale 0.01          # تجربة سريعة
+#   python benchmarks/bench_database.py --output report.json  # تقرير JSON
+#   python benchmarks/bench_database.py --compare old.json    # مقارنة مع تقرير سابق
+#
+# كل عملية تُسخّن أولاً ثم تُقاس في --repeats جولات؛ p50 المعتمد هو أقل وسيط بين الجولات،
+# والفرق بين الجولات (الضجيج) يُحفظ في التقرير ويرفع عتبة التراجع عند المقارنة.
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+import rendering
+
+FULL_SIZE = {'users': 1_000_000, 'courses': 10_000, 'videos': 500_000, 'articles': 50_000}
+REGRESSION_THRESHOLD = 1.2  # p50 أبطأ بـ 20% أو أكثر يُعد تراجعاً...
+ABSOLUTE_THRESHOLD_MS = 0.05  # ...وبفرق مطلق أكبر من هذا (عمليات الميكروثانية تتذبذب بنسب كبيرة)
+MIN_SAMPLES = 30            # أقل عدد قياسات لكل جولة، حتى للعمليات الثقيلة
+
+def seed(sizes: dict, rng: random.Random):
+    conn = database.connection()
+    with database.transaction():
+        conn.executemany(
+            'INSERT INTO users (user_id, username, first_name, invites_count, referrer_id) VALUES (?, ?, ?, ?, ?)',
+            ((uid, f"user{uid}", f"name{uid}", rng.randint(0, 10),
+              rng.randint(1, sizes['users']) if rng.random() < 0.3 else None)
+             for uid in range(1, sizes['users'] + 1))
+        )
+        per_course = max(1, sizes['videos'] // sizes['courses'])
+        conn.executemany(
+            'INSERT INTO courses (id, name, videos_count) VALUES (?, ?, ?)',
+            ((cid, f"course {cid}", per_course) for cid in range(1, sizes['courses'] + 1))
+        )
+        conn.executemany(
+            'INSERT INTO videos (course_id, file_id, message_id, video_order) VALUES (?, ?, ?, ?)',
+            ((cid, f"file-{cid}-{order}", cid * 1000 + order, order)
+             for cid in range(1, sizes['courses'] + 1) for order in range(1, per_course + 1))
+        )
+        body = "نص مقال تجريبي " * 40
+        conn.executemany(
+            'INSERT INTO articles (id, title, content, chunks_count) VALUES (?, ?, ?, 1)',
+            ((aid, f"مقال {aid}", body) for aid in range(1, sizes['articles'] + 1))
+        )
+        conn.executemany(
+            'INSERT INTO article_chunks (article_id, chunk_index, text) VALUES (?, 0, ?)',
+            ((aid, rendering.render_article(f"مقال {aid}", body)[0]) for aid in range(1, sizes['articles'] + 1))
+        )
+    database.count_cache.clear()
+    database.user_cache.clear()
+
+def measure(name: str, func, iterations: int, repeats: int) -> dict:
+    """تسخين ثم repeats جولات من iterations استدعاء. func(i) تأخذ رقماً متزايداً عبر كل الجولات
+    حتى لا تعيد الجولات اللاحقة نفس المفاتيح (فتقيس ذاكرة التخزين المؤقت فقط)."""
+    counter = iter(range(10 ** 9))
+    for _ in range(max(3, iterations // 10)):
+        func(next(counter))
+
+    rounds, latencies = [], []
+    total = 0.0
+    gc_enabled = gc.isenabled()
+    gc.disable()  # مثل timeit: جمع القمامة لا يُحسب على العملية المقاسة
+    try:
+        for _ in range(repeats):
+            round_latencies = []
+            start = time.perf_counter()
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                func(next(counter))
+                round_latencies.append(time.perf_counter() - t0)
+            total += time.perf_counter() - start
+            rounds.append(statistics.median(round_latencies) * 1000)
+            latencies.extend(round_latencies)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    latencies.sort()
+    best = min(rounds)
+    result = {
+        'iterations': iterations,
+        'repeats': repeats,
+        'ops_per_sec': len(latencies) / total if total else 0.0,
+        'p50_ms': best,
+        'p50_runs_ms': rounds,
+        'noise': (max(rounds) - best) / best if best else 0.0,  # فرق أبطأ جولة عن أسرعها
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+    print(f"{name:<28} {result['ops_per_sec']:>10.0f} ops/s  "
+          f"p50 {result['p50_ms']:>8.3f} ms  p99 {result['p99_ms']:>8.3f} ms  noise {result['noise']:>5.0%}")
+    return result
+
+def run(sizes: dict, iterations: int, repeats: int, rng: random.Random) -> dict:
+    users, courses = sizes['users'], sizes['courses']
+    keys = iterations * (repeats + 1)  # جولات القياس + التسخين
+    user_ids = [rng.randint(1, users) for _ in range(keys)]
+    course_ids = [rng.randint(1, courses) for _ in range(keys)]
+    heavy = max(MIN_SAMPLES, iterations // 100)  # عمليات تمسح جداول كاملة
+    iterations = max(MIN_SAMPLES, iterations)
+
+    def bench(name, func, n=iterations):
+        results[name] = measure(name, func, n, repeats)
+
+    results = {}
+    bench('get_user', lambda i: database.get_user(user_ids[i % keys]))
+    bench('add_or_update_user', lambda i: database.add_or_update_user(user_ids[i % keys], f"u{i}", "n", None))
+    bench('increment_invites', lambda i: database.increment_invites(user_ids[i % keys]))
+    bench('get_courses', lambda i: database.get_courses(), heavy)
+    bench('get_courses_page', lambda i: database.get_courses_page((i * 5) % courses, 5))
+    bench('get_videos', lambda i: database.get_videos(course_ids[i % keys]))
+    bench('get_video_at', lambda i: database.get_video_at(course_ids[i % keys], 0))
+    bench('get_articles', lambda i: database.get_articles(), heavy)
+    bench('get_articles_page', lambda i: database.get_articles_page(i % sizes['articles'], 1))
+    bench('get_article_chunk_at', lambda i: database.get_article_chunk_at(i % sizes['articles'], 0))
+    bench('get_all_users_ids', lambda i: database.get_all_users_ids(), heavy)
+    return results
+
+def compare(report: dict, baseline_path: str) -> bool:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nComparison with {baseline_path} (best p50 ratio; regression = above "
+          f"max(x{REGRESSION_THRESHOLD}, 1 + noise of either run) and slower by >{ABSOLUTE_THRESHOLD_MS} ms):")
+    for name, result in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old or not old['p50_ms']:
+            print(f"  {name:<28} (new)")
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        limit = max(REGRESSION_THRESHOLD, 1 + old.get('noise', 0.0), 1 + result['noise'])
+        slower = result['p50_ms'] - old['p50_ms'] > ABSOLUTE_THRESHOLD_MS
+        flag = "REGRESSION" if ratio > limit and slower else ""
+        ok = ok and not flag
+        print(f"  {name:<28} {old['p50_ms']:>8.3f} -> {result['p50_ms']:>8.3f} ms  x{ratio:.2f} {flag}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="database.py benchmark")
+    parser.add_argument('--scale', type=float, default=1.0, help="fraction of the production-size dataset")
+    parser.add_argument('--iterations', type=int, default=2000, help="calls per round (full-scan operations: 1%%)")
+    parser.add_argument('--repeats', type=int, default=5, help="measured rounds per operation (best p50 is kept)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write a JSON report to this path")
+    parser.add_argument('--compare', help="compare against a previous JSON report")
+    args = parser.parse_args()
+
+    sizes = {name: max(1, int(size * args.scale)) for name, size in FULL_SIZE.items()}
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        t0 = time.perf_counter()
+        seed(sizes, rng)
+        print(f"Seeded {sizes} in {time.perf_counter() - t0:.1f}s")
+        results = run(sizes, args.iterations, args.repeats, rng)
+        database.close_db()
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sizes': sizes,
+        'iterations': args.iterations,
+        'repeats': args.repeats,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.output}")
+    if args.compare and not compare(report, args.compare):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
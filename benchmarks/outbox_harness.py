@@ -0,0 +1,110 @@
+# benchmarks/outbox_harness.py
+# تشغيل outbox.Outbox على بوت وهمي محلي (دون تيليجرام) والتحقق من سلوكه:
+# أولوية المسارات، ترتيب FIFO لكل دردشة، إعادة المحاولة عند RetryAfter، وعدم خصم التعديلات من حد الدردشة.
+#
+# التشغيل:
+#   python benchmarks/outbox_harness.py      # يخرج بالرمز 1 إذا فشل أي سيناريو
+import asyncio
+import os
+import sys
+import time
+
+from telegram.error import RetryAfter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from outbox import Outbox, INTERACTIVE, NOTIFICATION, BROADCAST
+
+class FakeBot:
+    """يسجل الطلبات بترتيب تنفيذها، ويرمي RetryAfter لأول retry_after[chat_id] محاولة لتلك الدردشة."""
+
+    def __init__(self, latency: float = 0.005, retry_after: dict = None):
+        self.latency = latency
+        self.retry_after = dict(retry_after or {})
+        self.log = []  # (method, chat_id, text)
+
+    async def _call(self, method: str, chat_id, text: str):
+        await asyncio.sleep(self.latency)
+        if self.retry_after.get(chat_id, 0) > 0:
+            self.retry_after[chat_id] -= 1
+            raise RetryAfter(1)
+        self.log.append((method, chat_id, text))
+        return text
+
+    async def send_message(self, chat_id, text):
+        return await self._call('send_message', chat_id, text)
+
+    async def edit_message_text(self, chat_id, text):
+        return await self._call('edit_message_text', chat_id, text)
+
+async def lane_priority() -> str:
+    bot = FakeBot()
+    box = Outbox(global_rate=20, chat_rate=100, chat_burst=100, concurrency=1)
+    # الإذاعة تُجدول أولاً، ثم رد تفاعلي وإشعار أثناء انشغال المُجدول بها
+    broadcast = [asyncio.create_task(box.send(f"b{i}", lambda i=i: bot.send_message(f"b{i}", f"b{i}"), BROADCAST))
+                 for i in range(40)]
+    await asyncio.sleep(0.1)
+    sent_before = len(bot.log)
+    notice = asyncio.create_task(box.send("admin", lambda: bot.send_message("admin", "n"), NOTIFICATION))
+    reply = asyncio.create_task(box.send("user", lambda: bot.send_message("user", "r"), INTERACTIVE))
+    await asyncio.gather(*broadcast, notice, reply)
+    await box.stop()
+    order = [text for _, _, text in bot.log]
+    assert order.index("r") < order.index("n") < order.index("b39"), order
+    # على الأكثر طلب واحد قيد التنفيذ وآخر سُحب من الطابور ينتظر الحد العام
+    assert order.index("r") <= sent_before + 2, f"reply waited behind the broadcast: {order.index('r')} > {sent_before} + 2"
+    return f"reply sent at position {order.index('r')} of {len(order)} ({sent_before} sent before it was queued)"
+
+async def chat_fifo() -> str:
+    bot = FakeBot(retry_after={"c1": 1})  # أول طلب للدردشة c1 يُرفض بـ RetryAfter
+    box = Outbox(global_rate=30, chat_rate=1, chat_burst=3)
+    sends = [asyncio.create_task(box.send("c1", lambda i=i: bot.send_message("c1", f"c1-{i}"))) for i in range(5)]
+    sends += [asyncio.create_task(box.send("c2", lambda: bot.send_message("c2", "c2-0")))]
+    await asyncio.gather(*sends)
+    await box.stop()
+    c1 = [text for _, chat, text in bot.log if chat == "c1"]
+    assert c1 == [f"c1-{i}" for i in range(5)], c1
+    assert bot.log[0][1] == "c2", "other chats must not wait for a paused chat"
+    return f"c1 delivered in order {c1}"
+
+async def retry_after() -> str:
+    bot = FakeBot(retry_after={"ok": 1, "flood": 10})
+    box = Outbox(global_rate=30, chat_rate=10, chat_burst=10, max_attempts=2)
+    result = await box.send("ok", lambda: bot.send_message("ok", "hello"))
+    assert result == "hello" and box.retries == 1, (result, box.stats())
+    try:
+        await box.send("flood", lambda: bot.send_message("flood", "x"))
+    except RetryAfter:
+        pass
+    else:
+        raise AssertionError("RetryAfter must reach the caller after max_attempts")
+    stats = box.stats()
+    await box.stop()
+    return f"retries={stats['retries']} failed={stats['failed']}"
+
+async def edits_not_charged() -> str:
+    bot = FakeBot(latency=0)
+    box = Outbox(global_rate=100, chat_rate=1, chat_burst=1)
+    start = time.monotonic()
+    await box.send("c", lambda: bot.send_message("c", "menu"))
+    for i in range(10):
+        await box.send("c", lambda i=i: bot.edit_message_text("c", f"page {i}"), cost=0)
+    elapsed = time.monotonic() - start
+    await box.stop()
+    assert elapsed < 0.5, f"10 edits took {elapsed:.2f}s behind the per-chat message limit"
+    return f"1 message + 10 edits in {elapsed * 1000:.0f} ms"
+
+SCENARIOS = [lane_priority, chat_fifo, retry_after, edits_not_charged]
+
+def main():
+    failed = 0
+    for scenario in SCENARIOS:
+        try:
+            detail = asyncio.run(scenario())
+            print(f"PASS {scenario.__name__:<20} {detail}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {scenario.__name__:<20} {e}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# broadcast.py
+# محرك الإذاعة: مهام محفوظة في جدول broadcasts تُستأنف بعد إعادة التشغيل،
+# مستلمون يُقرأون على دفعات، ومعدل إرسال مضبوط بدلو رموز مع حد للتزامن.
+# الإرسال نفسه يمر عبر outbox في مسار BROADCAST، فلا تؤخر الإذاعة ردود المستخدمين.
+import asyncio
+import logging
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError, TimedOut, NetworkError
+
+import async_db as db
+import config
+import outbox
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+# المهام الجارية في هذه العملية: broadcast_id -> asyncio.Task
+_tasks = {}
+
+async def start_broadcast(bot, admin_id: int, message) -> int:
+    """إنشاء مهمة إذاعة لرسالة الأدمن (أي نوع: نص منسق، صورة، فيديو...) وتشغيلها."""
+    total = await db.count_broadcast_recipients()
+    broadcast_id = await db.create_broadcast(
+        admin_id, 'copy', from_chat_id=message.chat_id, message_id=message.message_id, total=total
+    )
+    _spawn(bot, broadcast_id)
+    return broadcast_id
+
+async def resume_broadcasts(bot):
+    """استئناف المهام التي لم تكتمل قبل توقف البوت."""
+    for job in await db.get_running_broadcasts():
+        logger.info(f"📢 Resuming broadcast {job['id']} after user {job['last_user_id']}")
+        _spawn(bot, job['id'])
+
+async def cancel_broadcast(broadcast_id: int):
+    await db.finish_broadcast(broadcast_id, 'cancelled')
+    task = _tasks.get(broadcast_id)
+    if task:
+        task.cancel()
+
+async def stop_all():
+    """إيقاف المهام عند إغلاق البوت؛ تبقى بحالة running في الجدول لتُستأنف لاحقاً."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def _spawn(bot, broadcast_id: int):
+    task = asyncio.create_task(_run(bot, broadcast_id), name=f"broadcast-{broadcast_id}")
+    _tasks[broadcast_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(broadcast_id, None))
+
+async def _send(bot, job: dict, user_id: int):
+    if job['kind'] == 'text':
+        await bot.send_message(chat_id=user_id, text=job['text'])
+    else:
+        await bot.copy_message(chat_id=user_id, from_chat_id=job['from_chat_id'], message_id=job['message_id'])
+
+async def _deliver(bot, job: dict, user_id: int, bucket: TokenBucket, slots: asyncio.Semaphore) -> str:
+    async with slots:
+        for attempt in range(MAX_ATTEMPTS):
+            await bucket.acquire()
+            try:
+                await outbox.send(user_id, lambda: _send(bot, job, user_id), outbox.BROADCAST)
+                return 'sent'
+            except RetryAfter as e:
+                # استنفد outbox محاولاته لهذه الدردشة: نبطئ الإذاعة كلها قبل المحاولة التالية
+                bucket.pause(e.retry_after)
+            except Forbidden:
+                await db.set_user_bot_blocked(user_id, True)
+                return 'blocked'
+            except (TimedOut, NetworkError):
+                await asyncio.sleep(1 + attempt)
+            except BadRequest as e:
+                logger.warning(f"Broadcast to {user_id} failed: {e}")
+                return 'failed'
+            except TelegramError as e:
+                logger.warning(f"Broadcast to {user_id} failed: {e}")
+                return 'failed'
+        return 'failed'
+
+def _progress_text(job: dict, counts: dict, done: int, started: float, started_done: int, finished: bool = False) -> str:
+    total = max(job['total'], done)
+    elapsed = time.monotonic() - started
+    rate = (done - started_done) / elapsed if elapsed > 0 else 0
+    header = "✅ تمت الإذاعة." if finished else "📢 جاري الإذاعة..."
+    lines = [
+        header,
+        f"التقدم: {done}/{total}",
+        f"نجح: {counts['sent']}",
+        f"فشل: {counts['failed']}",
+        f"حظروا البوت: {counts['blocked']}",
+    ]
+    if not finished and rate > 0:
+        eta = int((total - done) / rate)
+        lines.append(f"السرعة: {rate:.1f} رسالة/ث — المتبقي تقريباً: {eta // 60} د {eta % 60} ث")
+    return "\n".join(lines)
+
+def _cancel_keyboard(broadcast_id: int):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⛔ إيقاف الإذاعة", callback_data=f"admin_broadcast_cancel_{broadcast_id}")]])
+
+async def _report(bot, job: dict, text: str, finished: bool = False):
+    markup = None if finished else _cancel_keyboard(job['id'])
+    admin_id = job['admin_id']
+    try:
+        if job.get('progress_message_id'):
+            await outbox.edit(admin_id, lambda: bot.edit_message_text(
+                chat_id=admin_id, message_id=job['progress_message_id'], text=text, reply_markup=markup
+            ), outbox.NOTIFICATION)
+        else:
+            msg = await outbox.send(admin_id, lambda: bot.send_message(
+                chat_id=admin_id, text=text, reply_markup=markup
+            ), outbox.NOTIFICATION)
+            job['progress_message_id'] = msg.message_id
+            await db.set_broadcast_progress_message(job['id'], msg.message_id)
+    except BadRequest:
+        # "message is not modified" أو رسالة محذوفة: لا يؤثر على الإذاعة
+        pass
+    except TelegramError as e:
+        logger.warning(f"Broadcast progress report failed: {e}")
+
+async def _run(bot, broadcast_id: int):
+    job = await db.get_broadcast(broadcast_id)
+    if not job or job['status'] != 'running':
+        return
+
+    bucket = TokenBucket(config.BROADCAST_RATE)
+    slots = asyncio.Semaphore(config.BROADCAST_CONCURRENCY)
+    counts = {'sent': job['sent'], 'failed': job['failed'], 'blocked': job['blocked']}
+    cursor = job['last_user_id']
+    started = time.monotonic()
+    started_done = sum(counts.values())
+    last_report = 0.0
+
+    await _report(bot, job, _progress_text(job, counts, started_done, started, started_done))
+
+    while True:
+        recipients = await db.get_broadcast_recipients(cursor, config.BROADCAST_BATCH_SIZE)
+        if not recipients:
+            break
+        results = await asyncio.gather(*(_deliver(bot, job, uid, bucket, slots) for uid in recipients))
+        for result in results:
+            counts[result] += 1
+        cursor = recipients[-1]
+        # حفظ المؤشر بعد كل دفعة: عند التعطل يُعاد إرسال دفعة واحدة على الأكثر
+        await db.update_broadcast_progress(broadcast_id, cursor, counts['sent'], counts['failed'], counts['blocked'])
+
+        if time.monotonic() - last_report >= config.BROADCAST_PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            await _report(bot, job, _progress_text(job, counts, sum(counts.values()), started, started_done))
+
+    await db.finish_broadcast(broadcast_id, 'done')
+    await _report(bot, job, _progress_text(job, counts, sum(counts.values()), started, started_done, finished=True),
+                  finished=True)
+    logger.info(f"📢 Broadcast {broadcast_id} finished: {counts}")
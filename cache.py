@@ -0,0 +1,92 @@
+# cache.py
+# ذاكرة تخزين مؤقت بسيطة بمدة صلاحية (TTL) وحجم محدود مع إخلاء الأقدم استخداماً (LRU).
+# آمنة للاستخدام من عدة خيوط (خيوط قاعدة البيانات + حلقة الأحداث).
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# كل الذواكر المُنشأة، لعرض إحصاءات الإصابة/الإخفاق
+_registry = {}
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0  # يزداد مع كل كتابة، لمنع تعبئة قيم قديمة بعد تحديثها
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=MISSING):
+        """قراءة دون تحديث ترتيب LRU أو عدادات الإصابة."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._writes += 1
+            self._store(key, value, ttl)
+
+    def write_token(self) -> int:
+        """رمز يُؤخذ قبل القراءة من المصدر ويُمرر إلى fill()."""
+        return self._writes
+
+    def fill(self, key, value, token: int, ttl: float = None):
+        """تخزين قيمة مقروءة من المصدر فقط إذا لم تحدث كتابة منذ أخذ الرمز."""
+        with self._lock:
+            if token == self._writes:
+                self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._writes += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+def all_stats() -> dict:
+    return {name: cache.stats() for name, cache in _registry.items()}
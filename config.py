@@ -4,3 +4,82 @@ CHANNEL_ID = -1003091756917          # قناة الفيديوهات الخاص
 REQUIRED_CHANNEL = "@iIl337"         # قناة الاشتراك الإجباري
 ADMIN_IDS = [6689435577]              # معرف المدير (يمكن إضافة المزيد)
 DONATION_TARGET = "@OlIiIl7"          # حساب المدير لدعم النجوم 
+
+# ذاكرة التحقق من الاشتراك في القناة (بالثواني)
+MEMBERSHIP_CACHE_TTL = 300           # مدة تذكر أن المستخدم مشترك
+MEMBERSHIP_CACHE_NEGATIVE_TTL = 20   # مدة تذكر أنه غير مشترك (قصيرة حتى يظهر الاشتراك بسرعة)
+MEMBERSHIP_CACHE_SIZE = 50000
+
+# ذاكرة صفوف المستخدمين أمام جدول users
+USER_CACHE_SIZE = 20000
+USER_CACHE_TTL = 600
+USER_WRITE_BEHIND = True             # تأجيل تحديثات الملف الشخصي عند /start وكتابتها على دفعات
+USER_FLUSH_INTERVAL = 5              # ثواني بين كل دفعة
+
+# مُجدول الرسائل الصادرة (outbox.py) - حدود Bot API: ~30 رسالة/ث للبوت، ~1 رسالة/ث لكل دردشة
+OUTBOX_GLOBAL_RATE = 28              # رسالة/ثانية لكل البوت
+OUTBOX_CHAT_RATE = 1                 # رسالة/ثانية لكل دردشة على المدى الطويل
+OUTBOX_CHAT_BURST = 3                # دفعة قصيرة مسموحة لكل دردشة (مثل ألبوم + نص)
+OUTBOX_CONCURRENCY = 32              # أقصى طلبات متزامنة
+
+# الإذاعة
+BROADCAST_RATE = 25                  # رسالة/ثانية (حد Bot API العام حوالي 30)
+BROADCAST_CONCURRENCY = 10           # أقصى عدد طلبات إرسال متزامنة
+BROADCAST_BATCH_SIZE = 200           # عدد المستلمين المقروءين في كل دفعة (وحدة الاستئناف)
+BROADCAST_PROGRESS_INTERVAL = 10     # ثواني بين تحديثات رسالة التقدم
+
+# معرض الإنجازات
+ACHIEVEMENTS_PER_PAGE = 3            # عناصر الصفحة (الصور والفيديوهات تُرسل كألبوم واحد، 10 كحد أقصى)
+
+# البحث في المقالات (/search)
+SEARCH_RESULTS_PER_PAGE = 5
+
+# البحث عن الكورسات بالوضع المضمّن (@bot نص) - يجب تفعيل inline mode من BotFather
+INLINE_RESULTS_PER_PAGE = 20         # نتائج كل دفعة (next_offset للباقي)
+INLINE_MAX_RESULTS = 200             # أقصى عدد نتائج لكل بحث
+INLINE_CACHE_TIME = 60               # ثواني تخزين النتائج لدى تيليجرام
+COURSE_SEARCH_CACHE_SIZE = 1000      # عدد نصوص البحث المحفوظة نتائجها في الذاكرة
+COURSE_SEARCH_CACHE_TTL = 600
+
+# طريقة استقبال التحديثات: "polling" أو "webhook"
+BOT_MODE = "polling"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_URL = ""                     # العنوان العام (مثل https://example.com)، فارغ = لا يُسجل لدى تيليجرام
+WEBHOOK_SECRET = ""                  # إلزامي لوضع webhook: يُقارن بترويسة X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = 40
+WEBHOOK_CERT = None                  # مسار شهادة (ذاتية التوقيع) لـ HTTPS مباشر
+WEBHOOK_KEY = None
+
+# معالجة التحديثات بالتوازي (تحديثات المستخدم الواحد تبقى بالترتيب)
+MAX_CONCURRENT_UPDATES = 256         # تحديثات جارية فعلياً (المنتظرة خلف تحديث للمستخدم نفسه لا تُحسب)
+
+# الحماية من الضغط المتكرر (لكل مستخدم، الأدمن مستثنى)
+FLOOD_RATE = 2                       # تحديث/ثانية على المدى الطويل
+FLOOD_BURST = 6                      # أقصى دفعة متتالية مسموحة
+FLOOD_INLINE_RATE = 5                # استعلام مضمّن/ثانية (كل حرف يُكتب استعلام)
+FLOOD_INLINE_BURST = 20              # أقصى دفعة استعلامات مضمّنة
+FLOOD_TRACKED_USERS = 50000          # عدد المستخدمين المتتبعين في الذاكرة (الأقدم يُحذف)
+
+# حفظ user_data وحالات المحادثات في قاعدة البيانات
+PERSISTENCE_INTERVAL = 30            # ثواني بين كل دفعة حفظ
+PERSISTENCE_TRACKED_USERS = 50000    # مستخدمون تُتتبع حالة تحميلهم في الذاكرة (الأقدم يُحذف ويُعاد تحميله)
+
+# إحصائيات الأدمن (عدادات تُحدّث مع كل كتابة)
+STATS_RECONCILE_INTERVAL = 3600      # ثواني بين كل مطابقة للعدادات مع الجداول
+
+# مستكشف الدعوات
+REFERRAL_LEADERBOARD_SIZE = 10       # عدد الداعين في لوحة الصدارة
+REFERRALS_PER_PAGE = 20              # عدد المدعوين في الصفحة
+REFERRAL_BURST_WINDOW = 3600         # ثواني: نافذة كشف الدعوات المتدفقة
+REFERRAL_BURST_THRESHOLD = 20        # عدد المدعوين خلال النافذة الذي يُعد مشبوهاً
+
+# ملخص إشعارات الأدمن (دعوات، إكمال الدعوات، أخطاء)
+ADMIN_DIGEST_INTERVAL = 300          # ثواني بين كل ملخص
+ADMIN_DIGEST_IMMEDIATE_LIMIT = 3     # أحداث تُرسل فوراً في كل فترة قبل التحول للملخص، 0 = الملخص دائماً
+ADMIN_DIGEST_MAX_LINES = 20          # أقصى عدد أحداث تُعرض بالتفصيل في الملخص
+
+# القياسات (Prometheus) على http://METRICS_HOST:METRICS_PORT/metrics، المنفذ 0 = معطل
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
@@ -1,8 +1,12 @@
 # courses.py
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaVideo,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from telegram.ext import ContextTypes
-from telegram.error import TelegramError
-from database import get_courses, get_videos
+from telegram.error import BadRequest, TelegramError
+import async_db as db
+import outbox
 from keyboards import courses_navigation_keyboard, back_to_main_button
 from subscription import check_subscription_and_invite, is_user_subscribed
 import config
@@ -12,12 +16,11 @@ logger = logging.getLogger(__name__)
 
 async def is_user_qualified(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """التحقق من أن المستخدم مؤهل لاستخدام الكورسات."""
-    from database import get_user, is_invite_system_enabled
     user_id = update.effective_user.id
-    user = get_user(user_id)
+    user = await db.get_user(user_id)
 
     if user.get('blocked', 0):
-        await update.effective_message.reply_text("⛔ أنت محظور.")
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text("⛔ أنت محظور."))
         return False
 
     # تأكد من الاشتراك (يتم إعادة التوجيه إذا لم يكن مشتركاً)
@@ -26,7 +29,7 @@ async def is_user_qualified(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return False
 
     # إذا كان نظام الدعوات معطلاً أو معفى أو مكتمل
-    if (not is_invite_system_enabled() or
+    if (not await db.is_invite_system_enabled() or
         user.get('exempt_from_invites', 0) or
         user.get('invites_count', 0) >= 5):
         return True
@@ -39,16 +42,16 @@ async def show_courses(update: Update, context: ContextTypes.DEFAULT_TYPE, page:
     if not await is_user_qualified(update, context):
         return
 
-    courses = get_courses()
-    if not courses:
-        await update.effective_message.reply_text("لا توجد كورسات متاحة حالياً.")
+    total = await db.count_courses()
+    if not total:
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "لا توجد كورسات متاحة حالياً."))
         return
 
     per_page = 5
-    total_pages = (len(courses) + per_page - 1) // per_page
-    start = page * per_page
-    end = start + per_page
-    current_courses = courses[start:end]
+    total_pages = (total + per_page - 1) // per_page
+    page = max(0, min(page, total_pages - 1))
+    current_courses = await db.get_courses_page(page * per_page, per_page)
 
     keyboard = []
     for course in current_courses:
@@ -67,9 +70,11 @@ async def show_courses(update: Update, context: ContextTypes.DEFAULT_TYPE, page:
 
     reply_markup = InlineKeyboardMarkup(keyboard)
     if update.callback_query:
-        await update.callback_query.edit_message_text("اختر الكورس:", reply_markup=reply_markup)
+        await outbox.edit(update.effective_chat.id, lambda: update.callback_query.edit_message_text(
+            "اختر الكورس:", reply_markup=reply_markup))
     else:
-        await update.effective_message.reply_text("اختر الكورس:", reply_markup=reply_markup)
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "اختر الكورس:", reply_markup=reply_markup))
 
 async def handle_course_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -91,32 +96,84 @@ async def handle_course_selection(update: Update, context: ContextTypes.DEFAULT_
         # سيتم التعامل معها في handlers
         pass
 
+async def open_course(update: Update, context: ContextTypes.DEFAULT_TYPE, course_id: int):
+    """فتح كورس مباشرة (رابط t.me/bot?start=course_<id> من نتائج البحث المضمّن)."""
+    if not await is_user_qualified(update, context):
+        return
+    if not await db.get_course(course_id):
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "هذا الكورس لم يعد موجوداً."))
+        return
+    context.user_data['current_course'] = course_id
+    context.user_data['video_index'] = 0
+    await show_video(update, context)
+
+async def inline_course_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """@bot <نص>: البحث في أسماء الكورسات، بدفعات عبر next_offset."""
+    inline_query = update.inline_query
+    courses = await db.search_courses(inline_query.query, config.INLINE_MAX_RESULTS)
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+    page = courses[offset:offset + config.INLINE_RESULTS_PER_PAGE]
+
+    bot_username = context.bot.username
+    results = [
+        InlineQueryResultArticle(
+            id=str(course['id']),
+            title=course['name'],
+            description=f"{course['videos_count']} فيديو",
+            input_message_content=InputTextMessageContent(f"📚 {course['name']}"),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(
+                "▶️ مشاهدة الكورس", url=f"https://t.me/{bot_username}?start=course_{course['id']}"
+            )]]),
+        )
+        for course in page
+    ]
+    next_offset = offset + len(page)
+    await inline_query.answer(
+        results,
+        next_offset=str(next_offset) if next_offset < len(courses) else "",
+        cache_time=config.INLINE_CACHE_TIME,
+    )
+
+async def _show_notice(update: Update, text: str):
+    """رسالة خطأ/تنبيه: تعديل الرسالة النصية إن أمكن، وإلا رسالة جديدة (رسالة الفيديو لا نص فيها)."""
+    query = update.callback_query
+    if query and query.message and query.message.text:
+        await outbox.edit(update.effective_chat.id, lambda: query.edit_message_text(text))
+    else:
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(text))
+
 async def show_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     course_id = context.user_data.get('current_course')
     video_index = context.user_data.get('video_index', 0)
 
     if course_id is None:
-        await query.edit_message_text("حدث خطأ، الرجاء البدء من جديد.")
+        await _show_notice(update, "حدث خطأ، الرجاء البدء من جديد.")
         return
 
-    videos = get_videos(course_id)
-    if not videos:
-        await query.edit_message_text("هذا الكورس لا يحتوي على فيديوهات.")
+    video = await db.get_video_at(course_id, video_index)
+    if not video or not video['videos_count']:
+        await _show_notice(update, "هذا الكورس لا يحتوي على فيديوهات.")
         return
 
-    if video_index < 0 or video_index >= len(videos):
+    total_videos = video['videos_count']
+    if video_index < 0 or video_index >= total_videos:
         video_index = 0
         context.user_data['video_index'] = 0
+        video = await db.get_video_at(course_id, 0)
 
-    video = videos[video_index]
     file_id = video['file_id']
+    caption = f"الجزء {video_index+1} من {total_videos}"
 
     keyboard = []
     nav_row = []
     if video_index > 0:
         nav_row.append(InlineKeyboardButton("⏪ السابق", callback_data="prev_video"))
-    if video_index < len(videos) - 1:
+    if video_index < total_videos - 1:
         nav_row.append(InlineKeyboardButton("التالي ⏩", callback_data="next_video"))
     if nav_row:
         keyboard.append(nav_row)
@@ -124,19 +181,34 @@ async def show_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard.append([InlineKeyboardButton("🏠 القائمة الرئيسية", callback_data="back_to_main")])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
+    chat_id = update.effective_chat.id
 
     try:
-        await query.edit_message_text("جاري تحميل الفيديو...")
-        await context.bot.send_video(
-            chat_id=update.effective_chat.id,
+        if query and query.message and query.message.video:
+            # التنقل بين الفيديوهات: استبدال الفيديو في نفس الرسالة بطلب واحد
+            try:
+                await outbox.edit(chat_id, lambda: query.edit_message_media(
+                    InputMediaVideo(file_id, caption=caption),
+                    reply_markup=reply_markup
+                ))
+            except BadRequest as e:
+                # ضغطتان سريعتان على نفس الزر
+                if "not modified" not in str(e):
+                    raise
+            return
+
+        # أول فيديو من قائمة الكورسات (رسالة نصية لا يمكن تحويلها لفيديو): إرسال ثم حذف القائمة
+        await outbox.send(chat_id, lambda: context.bot.send_video(
+            chat_id=chat_id,
             video=file_id,
-            caption=f"الجزء {video_index+1} من {len(videos)}",
+            caption=caption,
             reply_markup=reply_markup
-        )
-        await query.message.delete()
+        ))
+        if query:
+            await outbox.edit(chat_id, query.message.delete)
     except TelegramError as e:
         logger.error(f"Failed to send video: {e}")
-        await query.edit_message_text("حدث خطأ أثناء إرسال الفيديو. حاول مرة أخرى.")
+        await _show_notice(update, "حدث خطأ أثناء إرسال الفيديو. حاول مرة أخرى.")
 
 async def navigate_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
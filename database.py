@@ -1,28 +1,102 @@
 # database.py
 import sqlite3
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 
+from cache import TTLCache, MISSING
+import arabic
+import config
+import rendering
+
 DATABASE = 'courses.db'
+BUSY_TIMEOUT = 5.0             # ثواني انتظار قفل الكتابة قبل الفشل
+STATEMENT_CACHE_SIZE = 256     # عدد الاستعلامات المُحضّرة المحفوظة لكل اتصال
+
+# اتصال واحد دائم لكل خيط (sqlite3 لا يسمح بمشاركة الاتصال بين الخيوط بشكل آمن)
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DATABASE,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        isolation_level=None,  # المعاملات تُدار صراحةً عبر transaction()
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}')
+    return conn
+
+def connection() -> sqlite3.Connection:
+    """إرجاع الاتصال الدائم الخاص بالخيط الحالي (يُنشأ عند أول استخدام)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+    return conn
+
+def close_db():
+    """إغلاق اتصال الخيط الحالي (عند إيقاف البوت)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 def get_db():
     class ConnectionContextManager:
         def __enter__(self):
-            self.conn = sqlite3.connect(DATABASE)
-            self.conn.row_factory = sqlite3.Row
-            return self.conn
+            return connection()
         def __exit__(self, exc_type, exc_val, exc_tb):
-            self.conn.close()
+            # الاتصال دائم: لا يُغلق بعد كل استدعاء
+            pass
     return ConnectionContextManager()
 
+@contextmanager
+def transaction():
+    """نطاق معاملة صريح: BEGIN IMMEDIATE ثم COMMIT أو ROLLBACK عند الخطأ.
+    المعاملات المتداخلة تنضم إلى المعاملة الخارجية."""
+    conn = connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+    finally:
+        _local.depth = 0
+
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    """إضافة عمود لجدول موجود مسبقاً (ترحيل بسيط لقواعد البيانات القديمة)."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+    return False
+
 def init_db():
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         # الكورسات
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS courses (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                videos_count INTEGER NOT NULL DEFAULT 0,
+                name_norm TEXT
             )
         ''')
         # الفيديوهات
@@ -36,6 +110,27 @@ def init_db():
                 FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_videos_course_order ON videos (course_id, video_order)')
+        # الاسم بعد توحيده (للبحث بالبادئة من الفهرس)، يُكتب من بايثون مع الاسم
+        _ensure_column(cursor, 'courses', 'name_norm', 'TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_name_norm ON courses (name_norm)')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_courses_name_norm_insert')
+        cursor.execute('DROP TRIGGER IF EXISTS trg_courses_name_norm_update')
+        # فهرس كلمات أسماء الكورسات (FTS5) للمطابقة داخل الاسم، يُكتب من بايثون مثل articles_fts
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'courses_fts'")
+        courses_fts_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5(
+                name, tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        _backfill_course_names(cursor, all_rows=not courses_fts_exists)
+        # عدد فيديوهات كل كورس محفوظ في صف الكورس (يُحسب مرة واحدة لقواعد البيانات القديمة)
+        if _ensure_column(cursor, 'courses', 'videos_count', 'INTEGER NOT NULL DEFAULT 0'):
+            cursor.execute('''
+                UPDATE courses
+                SET videos_count = (SELECT COUNT(*) FROM videos WHERE videos.course_id = courses.id)
+            ''')
         # المستخدمين
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -50,9 +145,22 @@ def init_db():
                 blocked BOOLEAN DEFAULT 0,
                 referrer_id INTEGER,
                 invite_message_shown BOOLEAN DEFAULT 0,
-                invite_rewarded BOOLEAN DEFAULT 0
+                invite_rewarded BOOLEAN DEFAULT 0,
+                bot_blocked BOOLEAN DEFAULT 0,
+                referred_at TIMESTAMP
             )
         ''')
+        # المستخدم حظر البوت (يُكتشف عند فشل الإرسال بـ Forbidden)
+        _ensure_column(cursor, 'users', 'bot_blocked', 'BOOLEAN DEFAULT 0')
+        # وقت تسجيل الداعي (لكشف الدعوات المتدفقة)؛ للصفوف القديمة يُقرّب بوقت الانضمام
+        if _ensure_column(cursor, 'users', 'referred_at', 'TIMESTAMP'):
+            cursor.execute('UPDATE users SET referred_at = joined_at WHERE referrer_id IS NOT NULL')
+        # شجرة الدعوات: مدعوو كل داعٍ مرتبين بالوقت، والدعوات الحديثة لكل الداعين
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_referrer ON users (referrer_id, referred_at)')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_users_referred_at ON users (referred_at, referrer_id)
+            WHERE referrer_id IS NOT NULL
+        ''')
         # الإعدادات العامة
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
@@ -60,8 +168,9 @@ def init_db():
                 value TEXT
             )
         ''')
-        cursor.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)',
-                       ('invite_system_enabled', 'true'))
+        for key, value in SETTINGS_DEFAULTS.items():
+            cursor.execute('INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)',
+                           (key, _serialize_setting(value)))
         # معرض الإنجازات
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS achievements (
@@ -78,100 +187,364 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
                 content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                chunks_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # أجزاء المقال الجاهزة للإرسال (HTML مُهرّب ضمن حد طول الرسالة)، تُنشأ عند الحفظ
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_chunks (
+                article_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (article_id, chunk_index)
+            ) WITHOUT ROWID
+        ''')
+        if _ensure_column(cursor, 'articles', 'chunks_count', 'INTEGER NOT NULL DEFAULT 0'):
+            cursor.execute('SELECT id, title, content FROM articles')
+            for row in cursor.fetchall():
+                _store_article_chunks(cursor, row['id'], row['title'], row['content'])
+        else:
+            _rerender_oversized_chunks(cursor)
+        # فهارس الترتيب الزمني للعرض المقسم إلى صفحات
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_created ON courses (created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_achievements_created ON achievements (created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_created ON articles (created_at, id)')
+        # فهرس البحث في المقالات (FTS5) على النص بعد توحيده. يُكتب من add/update/delete_article
+        # (التوحيد في بايثون) وليس من triggers، حتى تعمل الكتابة من أي اتصال (sqlite3 CLI، سكربتات صيانة)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'")
+        fts_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                title, content, tokenize = 'unicode61 remove_diacritics 2'
             )
         ''')
-        conn.commit()
+        for trigger in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_articles_fts_{trigger}')
+        if not fts_exists:
+            cursor.execute('SELECT id, title, content FROM articles')
+            for row in cursor.fetchall():
+                _store_article_fts(cursor, row['id'], row['title'], row['content'])
+        # مرحلة إضافة كورس جديد (تبقى محفوظة إذا أُعيد تشغيل البوت أثناء الرفع)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestions (
+                admin_id INTEGER PRIMARY KEY,
+                course_name TEXT NOT NULL,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_videos (
+                admin_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                file_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                PRIMARY KEY (admin_id, position)
+            )
+        ''')
+        # حالة المستخدمين (user_data) ومحادثات ConversationHandler المحفوظة بين التشغيلات
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (name, key)
+            )
+        ''')
+        # مهام الإذاعة (للاستئناف بعد إعادة التشغيل)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,           -- 'text' أو 'copy'
+                text TEXT,
+                from_chat_id INTEGER,
+                message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'running',  -- running / done / cancelled
+                last_user_id INTEGER NOT NULL DEFAULT 0, -- مؤشر المستلمين (keyset)
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                blocked INTEGER NOT NULL DEFAULT 0,
+                progress_message_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        _init_stats(cursor)
+    load_settings()
 
 # --- دوال المستخدمين ---
+# ذاكرة صفوف المستخدمين: تُحدَّث بعد كل كتابة (write-through) حتى يظهر الحظر فوراً
+user_cache = TTLCache('users', config.USER_CACHE_SIZE, config.USER_CACHE_TTL)
+
+# تحديثات بيانات الملف الشخصي المؤجلة (write-behind): user_id -> (username, first_name, last_name)
+# تُجمع وتُكتب على دفعات عبر flush_pending_users، وتُطبق فوق أي صف يُقرأ قبل ذلك (get_user)،
+# والقراءات بـ SQL على عدة مستخدمين (الإذاعة، الإحصائيات، الدعوات) تكتبها أولاً.
+_pending_profiles: Dict[int, tuple] = {}
+_pending_lock = threading.Lock()
+
+def _apply_pending(row: Dict) -> Dict:
+    pending = _pending_profiles.get(row['user_id'])
+    if pending is not None:
+        row['username'], row['first_name'], row['last_name'] = pending
+        row['bot_blocked'] = 0
+    return row
+
+def _refresh_cached_user(cursor, user_id: int):
+    """يُستدعى داخل معاملة الكتابة بعد تعديل صف المستخدم."""
+    cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    return _apply_pending(dict(row)) if row else None
+
+def _store_cached_user(user_id: int, row: Optional[Dict]):
+    if row is None:
+        user_cache.invalidate(user_id)
+    else:
+        user_cache.set(user_id, row)
+
 def add_or_update_user(user_id: int, username: str = None, first_name: str = None, last_name: str = None):
-    with get_db() as conn:
+    with _pending_lock:
+        _pending_profiles.pop(user_id, None)
+    with transaction() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        existing = cursor.fetchone()
-        if existing:
-            cursor.execute('''
-                UPDATE users
-                SET username = ?, first_name = ?, last_name = ?
-                WHERE user_id = ?
-            ''', (username, first_name, last_name, user_id))
-        else:
-            cursor.execute('''
-                INSERT INTO users (user_id, username, first_name, last_name, joined_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (user_id, username, first_name, last_name))
-        conn.commit()
+        cursor.execute(_UPSERT_USER_SQL, (user_id, username, first_name, last_name))
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
+
+_UPSERT_USER_SQL = '''
+    INSERT INTO users (user_id, username, first_name, last_name, joined_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        bot_blocked = 0
+'''
+
+def queue_user_profile(user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+    """تسجيل/تحديث مستخدم مع تأجيل الكتابة إن أمكن.
+    المستخدم المعروف (صفه في الذاكرة) يُؤجل تحديثه ويظهر فوراً لكل القراءات؛
+    المستخدم الجديد أو غير الموجود في الذاكرة يُكتب مباشرة حتى يوجد صفه قبل أي تحديث آخر."""
+    cached = user_cache.peek(user_id)
+    if not config.USER_WRITE_BEHIND or cached is MISSING:
+        add_or_update_user(user_id, username, first_name, last_name)
+        return
+    with _pending_lock:
+        _pending_profiles[user_id] = (username, first_name, last_name)
+    user_cache.set(user_id, _apply_pending(dict(cached)))
+
+def flush_pending_users() -> int:
+    """كتابة التحديثات المؤجلة في معاملة واحدة. تبقى في الذاكرة حتى يتم الـ COMMIT."""
+    with _pending_lock:
+        batch = dict(_pending_profiles)
+    if not batch:
+        return 0
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE users
+            SET username = ?, first_name = ?, last_name = ?, bot_blocked = 0
+            WHERE user_id = ?
+        ''', [(*profile, user_id) for user_id, profile in batch.items()])
+    with _pending_lock:
+        for user_id, profile in batch.items():
+            # لا تحذف ما تغيّر أثناء الكتابة
+            if _pending_profiles.get(user_id) is profile:
+                del _pending_profiles[user_id]
+    return len(batch)
 
 def get_user(user_id: int) -> Dict:
+    cached = user_cache.get(user_id)
+    if cached is not MISSING:
+        return dict(cached)
+    token = user_cache.write_token()
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
         if row:
+            row = _apply_pending(dict(row))
+            user_cache.fill(user_id, row, token)
             return dict(row)
         else:
             return {
                 'user_id': user_id, 'username': None, 'first_name': None, 'last_name': None,
                 'joined_at': None, 'is_subscribed': 0, 'invites_count': 0,
                 'exempt_from_invites': 0, 'blocked': 0, 'referrer_id': None,
-                'invite_message_shown': 0, 'invite_rewarded': 0
+                'invite_message_shown': 0, 'invite_rewarded': 0, 'bot_blocked': 0,
+                'referred_at': None
             }
 
 def set_user_blocked(user_id: int, blocked: bool = True):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET blocked = ? WHERE user_id = ?', (1 if blocked else 0, user_id))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def set_user_exempt(user_id: int, exempt: bool = True):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET exempt_from_invites = ? WHERE user_id = ?', (1 if exempt else 0, user_id))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def increment_invites(user_id: int):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET invites_count = invites_count + 1 WHERE user_id = ?', (user_id,))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def set_referrer(user_id: int, referrer_id: int):
     if user_id == referrer_id:
         return
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT referrer_id FROM users WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        if row and row['referrer_id'] is not None:
+        # لا يتغير الداعي بعد تعيينه
+        cursor.execute('''
+            UPDATE users SET referrer_id = ?, referred_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND referrer_id IS NULL
+        ''', (referrer_id, user_id))
+        if not cursor.rowcount:
             return
-        cursor.execute('UPDATE users SET referrer_id = ? WHERE user_id = ?', (referrer_id, user_id))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
+
+def set_user_subscribed(user_id: int, subscribed: bool = True):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET is_subscribed = ? WHERE user_id = ?', (1 if subscribed else 0, user_id))
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def set_invite_message_shown(user_id: int):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET invite_message_shown = 1 WHERE user_id = ?', (user_id,))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def mark_invite_rewarded(user_id: int):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET invite_rewarded = 1 WHERE user_id = ?', (user_id,))
-        conn.commit()
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
+
+def set_user_bot_blocked(user_id: int, blocked: bool = True):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET bot_blocked = ? WHERE user_id = ?', (1 if blocked else 0, user_id))
+        row = _refresh_cached_user(cursor, user_id)
+    _store_cached_user(user_id, row)
 
 def get_all_users_ids() -> List[int]:
+    flush_pending_users()
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT user_id FROM users')
         return [row['user_id'] for row in cursor.fetchall()]
 
+# --- عدد الصفوف (لحساب عدد الصفحات) ---
+# يُخزن مؤقتاً ويُبطل عند الإضافة أو الحذف
+count_cache = TTLCache('counts', 16, 3600)
+
+def _count(table: str) -> int:
+    cached = count_cache.get(table)
+    if cached is not MISSING:
+        return cached
+    token = count_cache.write_token()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        total = cursor.fetchone()[0]
+    count_cache.fill(table, total, token)
+    return total
+
 # --- دوال الكورسات والفيديوهات ---
+# نتائج البحث عن الكورسات (الوضع المضمّن) لكل نص بحث بعد توحيده؛ تُمسح عند أي تغيير في الكورسات
+course_search_cache = TTLCache('course_search', config.COURSE_SEARCH_CACHE_SIZE, config.COURSE_SEARCH_CACHE_TTL)
+
+def _courses_changed():
+    count_cache.invalidate('courses')
+    course_search_cache.clear()
+
 def get_courses() -> List[Dict]:
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id, name FROM courses ORDER BY created_at DESC')
         return [dict(row) for row in cursor.fetchall()]
 
+def get_courses_page(offset: int, limit: int) -> List[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name FROM courses
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        return [dict(row) for row in cursor.fetchall()]
+
+def count_courses() -> int:
+    return _count('courses')
+
+def search_courses(text: str, limit: int = 200) -> List[Dict]:
+    """الكورسات التي يبدأ اسمها بالنص أولاً ثم التي فيها كلمات تبدأ بكلماته، بعد توحيد النص العربي.
+    النص الفارغ يُرجع أحدث الكورسات."""
+    key = arabic.normalize(text).strip()
+    cached = course_search_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    token = course_search_cache.write_token()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if not key:
+            cursor.execute('''
+                SELECT id, name, videos_count FROM courses
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (limit,))
+            results = [dict(row) for row in cursor.fetchall()]
+        else:
+            # البادئة: نطاق على فهرس name_norm
+            cursor.execute('''
+                SELECT id, name, videos_count FROM courses
+                WHERE name_norm >= ? AND name_norm < ?
+                ORDER BY name_norm
+                LIMIT ?
+            ''', (key, key + '\U0010ffff', limit))
+            results = [dict(row) for row in cursor.fetchall()]
+            match = _fts_query(key)
+            if len(results) < limit and match:
+                # ثم الأسماء التي فيها كلمة تبدأ بالنص (من فهرس courses_fts)
+                seen = {row['id'] for row in results}
+                cursor.execute('''
+                    SELECT c.id, c.name, c.videos_count
+                    FROM courses_fts
+                    JOIN courses c ON c.id = courses_fts.rowid
+                    WHERE courses_fts MATCH ?
+                    ORDER BY c.name_norm
+                    LIMIT ?
+                ''', (match, limit))
+                results += [dict(row) for row in cursor.fetchall() if row['id'] not in seen][:limit - len(results)]
+    course_search_cache.fill(key, results, token)
+    return results
+
+def get_course(course_id: int) -> Optional[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name, videos_count FROM courses WHERE id = ?', (course_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
 def get_videos(course_id: int) -> List[Dict]:
     with get_db() as conn:
         cursor = conn.cursor()
@@ -183,37 +556,161 @@ def get_videos(course_id: int) -> List[Dict]:
         ''', (course_id,))
         return [dict(row) for row in cursor.fetchall()]
 
-def add_course(name: str) -> int:
+def get_video_at(course_id: int, index: int) -> Optional[Dict]:
+    """فيديو واحد حسب موضعه (يبدأ من 0) مع عدد فيديوهات الكورس، باستعلام واحد مفهرس.
+    الترتيب video_order متتالٍ يبدأ من 1 كما يُحفظ عند إضافة الكورس."""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO courses (name) VALUES (?)', (name,))
-        conn.commit()
-        return cursor.lastrowid
+        cursor.execute('''
+            SELECT v.id, v.file_id, v.message_id, v.video_order, c.videos_count
+            FROM courses c
+            LEFT JOIN videos v ON v.course_id = c.id AND v.video_order = ?
+            WHERE c.id = ?
+        ''', (index + 1, course_id))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+def _backfill_course_names(cursor, all_rows: bool = False):
+    """توحيد الأسماء الناقصة (قواعد بيانات سابقة، أو كورسات أُضيفت من خارج البوت) وفهرسة كلماتها.
+    all_rows: عند إنشاء courses_fts لأول مرة تُفهرس كل الكورسات."""
+    where = '' if all_rows else ' WHERE name_norm IS NULL'
+    cursor.execute(f'SELECT id, name FROM courses{where}')
+    rows = cursor.fetchall()
+    cursor.executemany('UPDATE courses SET name_norm = ? WHERE id = ?',
+                       [(arabic.normalize(row['name']), row['id']) for row in rows])
+    for row in rows:
+        _store_course_fts(cursor, row['id'], row['name'])
+
+def _store_course_fts(cursor, course_id: int, name: str):
+    cursor.execute('DELETE FROM courses_fts WHERE rowid = ?', (course_id,))
+    cursor.execute('INSERT INTO courses_fts (rowid, name) VALUES (?, ?)', (course_id, arabic.normalize(name)))
+
+def add_course(name: str) -> int:
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO courses (name, name_norm) VALUES (?, ?)', (name, arabic.normalize(name)))
+        course_id = cursor.lastrowid
+        _store_course_fts(cursor, course_id, name)
+    _courses_changed()
+    return course_id
 
 def delete_course(course_id: int):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM courses WHERE id=?', (course_id,))
-        conn.commit()
+        cursor.execute('DELETE FROM courses_fts WHERE rowid = ?', (course_id,))
+    _courses_changed()
 
 def add_video(course_id: int, file_id: str, message_id: int, video_order: int):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO videos (course_id, file_id, message_id, video_order)
             VALUES (?, ?, ?, ?)
         ''', (course_id, file_id, message_id, video_order))
-        conn.commit()
+        cursor.execute('UPDATE courses SET videos_count = videos_count + 1 WHERE id = ?', (course_id,))
+    _courses_changed()
+
+def _insert_course_with_videos(cursor, name: str, videos: List[Dict]) -> int:
+    cursor.execute('INSERT INTO courses (name, name_norm, videos_count) VALUES (?, ?, ?)',
+                   (name, arabic.normalize(name), len(videos)))
+    course_id = cursor.lastrowid
+    _store_course_fts(cursor, course_id, name)
+    cursor.executemany('''
+        INSERT INTO videos (course_id, file_id, message_id, video_order)
+        VALUES (?, ?, ?, ?)
+    ''', [(course_id, v['file_id'], v['message_id'], idx) for idx, v in enumerate(videos, start=1)])
+    return course_id
+
+def import_courses(courses: List[Dict], skip_existing: bool = True) -> Dict:
+    """استيراد كتالوج كامل [{'name': ..., 'videos': [{'file_id', 'message_id'}, ...]}] في معاملة واحدة."""
+    imported = skipped = videos_total = 0
+    with transaction() as conn:
+        cursor = conn.cursor()
+        for course in courses:
+            if skip_existing:
+                cursor.execute('SELECT 1 FROM courses WHERE name = ?', (course['name'],))
+                if cursor.fetchone():
+                    skipped += 1
+                    continue
+            _insert_course_with_videos(cursor, course['name'], course['videos'])
+            imported += 1
+            videos_total += len(course['videos'])
+    _courses_changed()
+    return {'imported': imported, 'skipped': skipped, 'videos': videos_total}
+
+def course_name_exists(name: str) -> bool:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM courses WHERE name = ?', (name,))
+        return cursor.fetchone() is not None
+
+# --- مرحلة إضافة كورس (staging) ---
+def start_ingestion(admin_id: int, course_name: str):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM ingestion_videos WHERE admin_id = ?', (admin_id,))
+        cursor.execute('REPLACE INTO ingestions (admin_id, course_name) VALUES (?, ?)', (admin_id, course_name))
+
+def rename_ingestion(admin_id: int, course_name: str) -> bool:
+    """تغيير اسم الكورس قيد الإضافة مع الإبقاء على الفيديوهات المرفوعة."""
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE ingestions SET course_name = ? WHERE admin_id = ?', (course_name, admin_id))
+        return cursor.rowcount > 0
+
+def stage_video(admin_id: int, file_id: str, message_id: int) -> int:
+    """حفظ فيديو مستلم في المرحلة، وإرجاع عدد الفيديوهات حتى الآن."""
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO ingestion_videos (admin_id, position, file_id, message_id)
+            VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM ingestion_videos WHERE admin_id = ?), ?, ?)
+        ''', (admin_id, admin_id, file_id, message_id))
+        cursor.execute('SELECT COUNT(*) FROM ingestion_videos WHERE admin_id = ?', (admin_id,))
+        return cursor.fetchone()[0]
+
+def get_ingestion(admin_id: int) -> Optional[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT course_name FROM ingestions WHERE admin_id = ?', (admin_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        cursor.execute('''
+            SELECT file_id, message_id FROM ingestion_videos
+            WHERE admin_id = ? ORDER BY position
+        ''', (admin_id,))
+        return {'course_name': row['course_name'], 'videos': [dict(r) for r in cursor.fetchall()]}
+
+def commit_ingestion(admin_id: int) -> Optional[Dict]:
+    """نقل الكورس وكل فيديوهاته من المرحلة إلى الجداول في معاملة واحدة."""
+    with transaction():
+        ingestion = get_ingestion(admin_id)
+        if not ingestion or not ingestion['videos']:
+            return None
+        cursor = connection().cursor()
+        course_id = _insert_course_with_videos(cursor, ingestion['course_name'], ingestion['videos'])
+        cursor.execute('DELETE FROM ingestion_videos WHERE admin_id = ?', (admin_id,))
+        cursor.execute('DELETE FROM ingestions WHERE admin_id = ?', (admin_id,))
+    _courses_changed()
+    return {'course_id': course_id, 'course_name': ingestion['course_name'], 'videos': len(ingestion['videos'])}
+
+def cancel_ingestion(admin_id: int):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM ingestion_videos WHERE admin_id = ?', (admin_id,))
+        cursor.execute('DELETE FROM ingestions WHERE admin_id = ?', (admin_id,))
 
 # --- دوال معرض الإنجازات ---
 def add_achievement(type_: str, content: str, caption: str = ""):
-    with get_db() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO achievements (type, content, caption)
             VALUES (?, ?, ?)
         ''', (type_, content, caption))
-        conn.commit()
+    count_cache.invalidate('achievements')
 
 def get_achievements() -> List[Dict]:
     with get_db() as conn:
@@ -221,21 +718,77 @@ def get_achievements() -> List[Dict]:
         cursor.execute('SELECT * FROM achievements ORDER BY created_at DESC')
         return [dict(row) for row in cursor.fetchall()]
 
-def delete_achievement(achievement_id: int):
+def get_achievements_page(offset: int, limit: int) -> List[Dict]:
     with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM achievements
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        return [dict(row) for row in cursor.fetchall()]
+
+def count_achievements() -> int:
+    return _count('achievements')
+
+def delete_achievement(achievement_id: int):
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM achievements WHERE id=?', (achievement_id,))
-        conn.commit()
+    count_cache.invalidate('achievements')
 
 # --- دوال المداد (مقالات) ---
-def add_article(title: str, content: str):
-    with get_db() as conn:
+def _rerender_oversized_chunks(cursor):
+    """أجزاء قُسّمت سابقاً بعدد الأحرف قد تتجاوز الحد بوحدات UTF-16 (إيموجي كثيرة): إعادة تقسيم مقالاتها."""
+    # الجزء الأقصر من نصف الحد لا يمكن أن يتجاوزه، فيُفحص الباقي فقط
+    cursor.execute('SELECT article_id, text FROM article_chunks WHERE length(text) > ?',
+                   (rendering.CHUNK_LIMIT // 2,))
+    oversized = {row['article_id'] for row in cursor.fetchall()
+                 if rendering.chunk_length(row['text']) > rendering.CHUNK_LIMIT}
+    for article_id in oversized:
+        cursor.execute('SELECT title, content FROM articles WHERE id = ?', (article_id,))
+        row = cursor.fetchone()
+        _store_article_chunks(cursor, article_id, row['title'], row['content'])
+
+def _store_article_fts(cursor, article_id: int, title: str, content: str):
+    cursor.execute('DELETE FROM articles_fts WHERE rowid = ?', (article_id,))
+    cursor.execute(
+        'INSERT INTO articles_fts (rowid, title, content) VALUES (?, ?, ?)',
+        (article_id, arabic.normalize(title), arabic.normalize(content))
+    )
+
+def _store_article_chunks(cursor, article_id: int, title: str, content: str) -> int:
+    chunks = rendering.render_article(title, content)
+    cursor.execute('DELETE FROM article_chunks WHERE article_id = ?', (article_id,))
+    cursor.executemany(
+        'INSERT INTO article_chunks (article_id, chunk_index, text) VALUES (?, ?, ?)',
+        [(article_id, i, text) for i, text in enumerate(chunks)]
+    )
+    cursor.execute('UPDATE articles SET chunks_count = ? WHERE id = ?', (len(chunks), article_id))
+    return len(chunks)
+
+def add_article(title: str, content: str) -> int:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO articles (title, content)
             VALUES (?, ?)
         ''', (title, content))
-        conn.commit()
+        article_id = cursor.lastrowid
+        _store_article_chunks(cursor, article_id, title, content)
+        _store_article_fts(cursor, article_id, title, content)
+    count_cache.invalidate('articles')
+    return article_id
+
+def update_article(article_id: int, title: str, content: str) -> bool:
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE articles SET title = ?, content = ? WHERE id = ?', (title, content, article_id))
+        if not cursor.rowcount:
+            return False
+        _store_article_chunks(cursor, article_id, title, content)
+        _store_article_fts(cursor, article_id, title, content)
+    return True
 
 def get_articles() -> List[Dict]:
     with get_db() as conn:
@@ -243,25 +796,393 @@ def get_articles() -> List[Dict]:
         cursor.execute('SELECT * FROM articles ORDER BY created_at DESC')
         return [dict(row) for row in cursor.fetchall()]
 
-def delete_article(article_id: int):
+def get_articles_page(offset: int, limit: int) -> List[Dict]:
     with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM articles
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        return [dict(row) for row in cursor.fetchall()]
+
+def count_articles() -> int:
+    return _count('articles')
+
+def delete_article(article_id: int):
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM articles WHERE id=?', (article_id,))
-        conn.commit()
+        cursor.execute('DELETE FROM article_chunks WHERE article_id = ?', (article_id,))
+        cursor.execute('DELETE FROM articles_fts WHERE rowid = ?', (article_id,))
+    count_cache.invalidate('articles')
 
-# --- دوال الإعدادات ---
-def get_setting(key: str, default: str = None) -> str:
+def get_article_chunk(article_id: int, chunk_index: int) -> Optional[Dict]:
+    """جزء جاهز للإرسال من مقال معين مع عدد أجزائه."""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
+        cursor.execute('''
+            SELECT a.id, a.chunks_count, c.text
+            FROM articles a
+            JOIN article_chunks c ON c.article_id = a.id AND c.chunk_index = ?
+            WHERE a.id = ?
+        ''', (chunk_index, article_id))
         row = cursor.fetchone()
-        return row['value'] if row else default
+        return dict(row) if row else None
 
-def set_setting(key: str, value: str):
+def get_article_chunk_at(offset: int, chunk_index: int) -> Optional[Dict]:
+    """جزء من المقال رقم offset حسب ترتيب العرض (الأحدث أولاً)، بقراءة مفهرسة واحدة."""
     with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT a.id, a.chunks_count, c.text
+            FROM (
+                SELECT id, chunks_count FROM articles
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1 OFFSET ?
+            ) a
+            JOIN article_chunks c ON c.article_id = a.id AND c.chunk_index = ?
+        ''', (offset, chunk_index))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+def _fts_query(text: str) -> str:
+    """كل كلمة بعد التوحيد كبادئة بين علامتي تنصيص (لا تُفسر كصيغة FTS5)، والكلمات مجتمعة (AND)."""
+    return ' '.join(f'"{token}"*' for token in arabic.tokens(text))
+
+SEARCH_RANK_LIMIT = 2000  # فوق هذا العدد من النتائج تُرتب بالأحدث بدل bm25 (ترتيب الكل مكلف)
+
+def search_articles(text: str, offset: int, limit: int) -> Dict:
+    """بحث مرتب بـ bm25 (العنوان أثقل وزناً) مع مقتطف حول الكلمات المطابقة.
+    المطابقة على النص الموحّد في الفهرس، والمقتطف من النص الأصلي (بإملائه وتشكيله)."""
+    terms = arabic.tokens(text)
+    match = _fts_query(text)
+    if not match:
+        return {'total': 0, 'results': []}
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM articles_fts WHERE articles_fts MATCH ?', (match,))
+        total = cursor.fetchone()[0]
+        order = 'bm25(articles_fts, 5.0, 1.0)' if total <= SEARCH_RANK_LIMIT else 'articles_fts.rowid DESC'
+        cursor.execute(f'''
+            SELECT a.id, a.title, a.content
+            FROM articles_fts
+            JOIN articles a ON a.id = articles_fts.rowid
+            WHERE articles_fts MATCH ?
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        ''', (match, limit, offset))
+        results = [
+            {'id': row['id'], 'title': row['title'], 'snippet': arabic.snippet(row['content'], terms)}
+            for row in cursor.fetchall()
+        ]
+        return {'total': total, 'results': results}
+
+# --- دوال الإذاعة ---
+def count_broadcast_recipients() -> int:
+    flush_pending_users()  # مستخدم ألغى حظر البوت وأرسل /start ينتظر في الذاكرة بـ bot_blocked = 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM users WHERE bot_blocked = 0')
+        return cursor.fetchone()[0]
+
+def get_broadcast_recipients(after_user_id: int, limit: int) -> List[int]:
+    """الدفعة التالية من المستلمين بعد المؤشر (بدون تحميل كل المستخدمين في الذاكرة)."""
+    flush_pending_users()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM users
+            WHERE user_id > ? AND bot_blocked = 0
+            ORDER BY user_id
+            LIMIT ?
+        ''', (after_user_id, limit))
+        return [row['user_id'] for row in cursor.fetchall()]
+
+def create_broadcast(admin_id: int, kind: str, text: str = None,
+                     from_chat_id: int = None, message_id: int = None, total: int = 0) -> int:
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO broadcasts (admin_id, kind, text, from_chat_id, message_id, total)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (admin_id, kind, text, from_chat_id, message_id, total))
+        return cursor.lastrowid
+
+def get_broadcast(broadcast_id: int) -> Optional[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM broadcasts WHERE id = ?', (broadcast_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+def get_running_broadcasts() -> List[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id")
+        return [dict(row) for row in cursor.fetchall()]
+
+def set_broadcast_progress_message(broadcast_id: int, message_id: int):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE broadcasts SET progress_message_id = ? WHERE id = ?', (message_id, broadcast_id))
+
+def update_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE broadcasts
+            SET last_user_id = ?, sent = ?, failed = ?, blocked = ?
+            WHERE id = ?
+        ''', (last_user_id, sent, failed, blocked, broadcast_id))
+
+def finish_broadcast(broadcast_id: int, status: str = 'done'):
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        ''', (status, broadcast_id))
+
+# --- دوال حالة المستخدمين والمحادثات (persistence) ---
+def get_user_state(user_id: int) -> Optional[str]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT data FROM user_state WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        return row['data'] if row else None
+
+def get_conversation_states(name: str) -> List[Dict]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, state FROM conversation_state WHERE name = ?', (name,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def save_states(user_states: List[tuple], dropped_users: List[int], conversations: List[tuple]):
+    """كتابة دفعة من التغييرات في معاملة واحدة.
+    user_states: [(user_id, json)]، conversations: [(name, key, state_json أو None للحذف)]."""
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO user_state (user_id, data) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+        ''', user_states)
+        conn.executemany('DELETE FROM user_state WHERE user_id = ?', [(uid,) for uid in dropped_users])
+        conn.executemany('REPLACE INTO conversation_state (name, key, state) VALUES (?, ?, ?)',
+                         [c for c in conversations if c[2] is not None])
+        conn.executemany('DELETE FROM conversation_state WHERE name = ? AND key = ?',
+                         [(name, key) for name, key, state in conversations if state is None])
+
+# --- إحصائيات الأدمن ---
+# عدادات مجمّعة في جدول stats_counters تحدّثها triggers داخل نفس معاملة كل كتابة على users
+# و courses، فتُقرأ لوحة الإحصائيات بزمن ثابت مهما كبر عدد المستخدمين.
+INVITES_REQUIRED = 5  # عدد الدعوات المطلوب لاستخدام البوت
+
+_USER_STATS = {
+    'users': '1',
+    'subscribed': 'IFNULL({row}.is_subscribed, 0) != 0',
+    'blocked': 'IFNULL({row}.blocked, 0) != 0',
+    'exempt': 'IFNULL({row}.exempt_from_invites, 0) != 0',
+    'bot_blocked': 'IFNULL({row}.bot_blocked, 0) != 0',
+    'invited': f'IFNULL({{row}}.invites_count, 0) >= {INVITES_REQUIRED}',
+}
+_COURSE_STATS = {
+    'courses': '1',
+    'videos': 'IFNULL({row}.videos_count, 0)',
+}
+
+def _stats_delta(stats: Dict[str, str], new: str = None, old: str = None) -> str:
+    """UPDATE يضيف قيمة الصف الجديد ويطرح قيمة الصف القديم لكل عداد."""
+    cases = []
+    for key, expr in stats.items():
+        delta = f"({expr.format(row=new)})" if new else "0"
+        if old:
+            delta += f" - ({expr.format(row=old)})"
+        cases.append(f"WHEN '{key}' THEN {delta}")
+    keys = ', '.join(f"'{key}'" for key in stats)
+    return f"UPDATE stats_counters SET value = value + CASE key {' '.join(cases)} ELSE 0 END WHERE key IN ({keys});"
+
+def _init_stats(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # أكثر الداعين وأكبر الكورسات تُقرأ من الفهرس مباشرة
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_invites ON users (invites_count)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_courses_videos ON courses (videos_count)')
+    for table, stats, columns in (
+        ('users', _USER_STATS, ('is_subscribed', 'blocked', 'exempt_from_invites', 'bot_blocked', 'invites_count')),
+        ('courses', _COURSE_STATS, ('videos_count',)),
+    ):
+        changed = ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in columns)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert AFTER INSERT ON {table}
+            BEGIN {_stats_delta(stats, new='NEW')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete AFTER DELETE ON {table}
+            BEGIN {_stats_delta(stats, old='OLD')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_update AFTER UPDATE OF {', '.join(columns)} ON {table}
+            WHEN {changed}
+            BEGIN {_stats_delta(stats, new='NEW', old='OLD')} END
+        ''')
+    cursor.execute('SELECT COUNT(*) FROM stats_counters')
+    if cursor.fetchone()[0] < len(_USER_STATS) + len(_COURSE_STATS):
+        # أول تشغيل بعد الترقية: حساب العدادات مرة واحدة من الجداول
+        _reconcile_stats(cursor)
+
+def _reconcile_stats(cursor) -> Dict[str, int]:
+    """إعادة حساب العدادات بمسح كامل وتصحيحها. تُرجع الفروق التي وُجدت."""
+    expected = {}
+    for table, stats in (('users', _USER_STATS), ('courses', _COURSE_STATS)):
+        columns = ', '.join(f"IFNULL(SUM({expr.format(row=table)}), 0)" for expr in stats.values())
+        cursor.execute(f'SELECT {columns} FROM {table}')
+        expected.update(zip(stats, cursor.fetchone()))
+    cursor.execute('SELECT key, value FROM stats_counters')
+    current = {row['key']: row['value'] for row in cursor.fetchall()}
+    drift = {key: value - current.get(key, 0) for key, value in expected.items() if current.get(key) != value}
+    if drift:
+        cursor.executemany('REPLACE INTO stats_counters (key, value) VALUES (?, ?)', list(expected.items()))
+    return drift
+
+def reconcile_stats() -> Dict[str, int]:
+    flush_pending_users()
+    with transaction() as conn:
+        return _reconcile_stats(conn.cursor())
+
+def get_admin_stats(top: int = 5) -> Dict:
+    """العدادات + أكثر الداعين + أكبر الكورسات (كلها من العدادات والفهارس، بلا مسح كامل)."""
+    flush_pending_users()  # bot_blocked والأسماء المؤجلة تنعكس على العدادات وقائمة الداعين
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, value FROM stats_counters')
+        stats = {row['key']: row['value'] for row in cursor.fetchall()}
+        stats['top_referrers'] = _top_referrers(cursor, top)
+        cursor.execute('SELECT id, name, videos_count FROM courses ORDER BY videos_count DESC LIMIT ?', (top,))
+        stats['top_courses'] = [dict(row) for row in cursor.fetchall()]
+        return stats
+
+# --- شجرة الدعوات ---
+def _top_referrers(cursor, limit: int) -> List[Dict]:
+    cursor.execute('''
+        SELECT user_id, username, first_name, invites_count FROM users
+        WHERE invites_count > 0
+        ORDER BY invites_count DESC
+        LIMIT ?
+    ''', (limit,))
+    return [dict(row) for row in cursor.fetchall()]
+
+def get_top_referrers(limit: int = 10) -> List[Dict]:
+    flush_pending_users()
+    with get_db() as conn:
+        return _top_referrers(conn.cursor(), limit)
+
+def get_referral_summary(referrer_id: int) -> Dict:
+    """عدد مدعوي المستخدم وعدد المشتركين منهم (من فهرس referrer_id)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) AS invited, IFNULL(SUM(is_subscribed != 0), 0) AS subscribed
+            FROM users WHERE referrer_id = ?
+        ''', (referrer_id,))
+        return dict(cursor.fetchone())
+
+def get_invitees_page(referrer_id: int, offset: int, limit: int) -> List[Dict]:
+    flush_pending_users()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, username, first_name, is_subscribed, invite_rewarded, referred_at
+            FROM users
+            WHERE referrer_id = ?
+            ORDER BY referred_at DESC
+            LIMIT ? OFFSET ?
+        ''', (referrer_id, limit, offset))
+        return [dict(row) for row in cursor.fetchall()]
+
+def get_referral_bursts(window_seconds: int, threshold: int, limit: int = 10) -> List[Dict]:
+    """الداعون الذين سُجل لهم threshold مدعو أو أكثر خلال آخر window_seconds ثانية.
+    يُقرأ نطاق الدعوات الحديثة فقط من فهرس referred_at."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT referrer_id, COUNT(*) AS invited, IFNULL(SUM(is_subscribed != 0), 0) AS subscribed,
+                   MIN(referred_at) AS first_at, MAX(referred_at) AS last_at
+            FROM users INDEXED BY idx_users_referred_at
+            WHERE referrer_id IS NOT NULL AND referred_at >= datetime('now', ?)
+            GROUP BY referrer_id
+            HAVING COUNT(*) >= ?
+            ORDER BY invited DESC
+            LIMIT ?
+        ''', (f'-{int(window_seconds)} seconds', threshold, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+# --- دوال الإعدادات ---
+# جدول settings يُحمّل مرة واحدة في الذاكرة وتُخدم القراءات منها؛ الكتابة تمر إلى القاعدة ثم الذاكرة.
+SETTINGS_DEFAULTS = {
+    'invite_system_enabled': True,
+}
+
+_settings: Dict[str, str] = {}
+_settings_loaded = False
+_settings_lock = threading.Lock()
+_settings_listeners: Dict[str, List] = {}
+
+def _serialize_setting(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def load_settings():
+    """تحميل (أو إعادة تحميل) جدول الإعدادات في الذاكرة."""
+    global _settings_loaded
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, value FROM settings')
+        rows = {row['key']: row['value'] for row in cursor.fetchall()}
+    with _settings_lock:
+        _settings.clear()
+        _settings.update(rows)
+        _settings_loaded = True
+
+def get_setting(key: str, default: str = None) -> str:
+    if not _settings_loaded:
+        load_settings()
+    value = _settings.get(key)
+    if value is not None:
+        return value
+    if default is None and key in SETTINGS_DEFAULTS:
+        return _serialize_setting(SETTINGS_DEFAULTS[key])
+    return default
+
+def get_setting_bool(key: str) -> bool:
+    return get_setting(key, _serialize_setting(SETTINGS_DEFAULTS.get(key, False))).lower() == 'true'
+
+def get_setting_int(key: str) -> int:
+    value = get_setting(key, _serialize_setting(SETTINGS_DEFAULTS.get(key, 0)))
+    try:
+        return int(value)
+    except ValueError:
+        return int(SETTINGS_DEFAULTS.get(key, 0))
+
+def set_setting(key: str, value):
+    value = _serialize_setting(value)
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute('REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
-        conn.commit()
+    with _settings_lock:
+        old = _settings.get(key)
+        _settings[key] = value
+    if old != value:
+        for callback in _settings_listeners.get(key, []):
+            callback(key, value)
+
+def on_setting_change(key: str, callback):
+    """تسجيل دالة تُستدعى بـ (key, value) عند تغيّر الإعداد (من الخيط الذي نفّذ الكتابة)."""
+    _settings_listeners.setdefault(key, []).append(callback)
 
 def is_invite_system_enabled() -> bool:
-    return get_setting('invite_system_enabled', 'true').lower() == 'true'
+    return get_setting_bool('invite_system_enabled')
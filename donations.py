@@ -3,6 +3,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from config import DONATION_TARGET
 from keyboards import back_to_main_button
+import outbox
 
 async def donate_stars(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # رسالة عاطفية طويلة تشرح حاجتنا للدعم
@@ -24,14 +25,14 @@ async def donate_stars(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     if update.callback_query:
-        await update.callback_query.edit_message_text(
+        await outbox.edit(update.effective_chat.id, lambda: update.callback_query.edit_message_text(
             message,
             parse_mode='Markdown',
             reply_markup=reply_markup
-        )
+        ))
     else:
-        await update.message.reply_text(
+        await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(
             message,
             parse_mode='Markdown',
             reply_markup=reply_markup
-        )
+        ))
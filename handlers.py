@@ -2,27 +2,38 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from keyboards import main_menu_keyboard, back_to_main_button
-from courses import show_courses, show_video, navigate_video, handle_course_selection
+from courses import show_courses, show_video, navigate_video, handle_course_selection, open_course
 from achievements import show_achievements
 from articles import show_articles
 from donations import donate_stars
 from admin import admin_callback_handler
+import async_db as db
+import outbox
 import config
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    from database import add_or_update_user
     from subscription import handle_referral
     user = update.effective_user
-    add_or_update_user(user.id, user.username, user.first_name, user.last_name)
+    await db.queue_user_profile(user.id, user.username, user.first_name, user.last_name)
     await handle_referral(update, context)
 
+    # رابط مباشر لكورس (من نتائج البحث المضمّن)
+    if context.args and context.args[0].startswith("course_"):
+        try:
+            course_id = int(context.args[0][len("course_"):])
+        except ValueError:
+            course_id = None
+        if course_id is not None:
+            await open_course(update, context, course_id)
+            return
+
     # التحقق من الاشتراك والدعوات
     from subscription import check_subscription_and_invite
     if await check_subscription_and_invite(update, context):
-        await update.message.reply_text(
+        await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(
             f"مرحباً {user.first_name}!",
             reply_markup=main_menu_keyboard()
-        )
+        ))
 
 async def about_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (
@@ -31,9 +42,11 @@ async def about_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "للاستفسارات: @YourSupport"
     )
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode='Markdown', reply_markup=back_to_main_button())
+        await outbox.edit(update.effective_chat.id, lambda: update.callback_query.edit_message_text(
+            text, parse_mode='Markdown', reply_markup=back_to_main_button()))
     else:
-        await update.message.reply_text(text, parse_mode='Markdown', reply_markup=back_to_main_button())
+        await outbox.send(update.effective_chat.id, lambda: update.message.reply_text(
+            text, parse_mode='Markdown', reply_markup=back_to_main_button()))
 
 async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -51,15 +64,19 @@ async def main_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     elif data == "main_donate":
         await donate_stars(update, context)
     elif data == "back_to_main":
-        await query.edit_message_text("مرحباً بك مجدداً!", reply_markup=main_menu_keyboard())
+        await outbox.edit(update.effective_chat.id, lambda: query.edit_message_text(
+            "مرحباً بك مجدداً!", reply_markup=main_menu_keyboard()))
 
 async def verify_subscription_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    await query.message.delete()
-    from subscription import check_subscription_and_invite
+    await outbox.edit(update.effective_chat.id, query.message.delete)
+    from subscription import check_subscription_and_invite, invalidate_membership
+    # المستخدم يؤكد أنه اشترك للتو: تجاهل النتيجة المخزنة
+    invalidate_membership(update.effective_user.id)
     if await check_subscription_and_invite(update, context):
-        await update.effective_message.reply_text("✅ تم التحقق بنجاح!", reply_markup=main_menu_keyboard())
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "✅ تم التحقق بنجاح!", reply_markup=main_menu_keyboard()))
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # تجاهل أي نصوص من المستخدمين العاديين (لأن كل شيء يتم عبر الأزرار)
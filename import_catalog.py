@@ -0,0 +1,53 @@
+# import_catalog.py
+# استيراد كتالوج كورسات كامل دفعة واحدة (بدون البوت) من ملف JSON أو CSV.
+#
+# JSON:
+#   [{"name": "اسم الكورس", "videos": [{"file_id": "...", "message_id": 12}, ...]}, ...]
+# CSV (الترتيب حسب عمود order إن وُجد، وإلا حسب ترتيب الأسطر):
+#   course,file_id,message_id[,order]
+#
+# التشغيل: python import_catalog.py manifest.json [--fail-on-existing]
+import csv
+import json
+import sys
+
+from database import init_db, import_courses, close_db
+
+def load_json(path: str):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_csv(path: str):
+    courses = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for line_no, row in enumerate(csv.DictReader(f)):
+            order = int(row['order']) if row.get('order') else line_no
+            courses.setdefault(row['course'].strip(), []).append(
+                (order, {'file_id': row['file_id'].strip(), 'message_id': int(row['message_id'])})
+            )
+    return [
+        {'name': name, 'videos': [video for _, video in sorted(videos, key=lambda v: v[0])]}
+        for name, videos in courses.items()
+    ]
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python import_catalog.py <manifest.json|manifest.csv> [--fail-on-existing]")
+        sys.exit(1)
+    path = sys.argv[1]
+    skip_existing = '--fail-on-existing' not in sys.argv[2:]
+    courses = load_csv(path) if path.lower().endswith('.csv') else load_json(path)
+
+    for course in courses:
+        if not course.get('name') or not course.get('videos'):
+            print(f"❌ Invalid entry (name and videos are required): {course.get('name')!r}")
+            sys.exit(1)
+
+    init_db()
+    result = import_courses(courses, skip_existing=skip_existing)
+    close_db()
+    print(f"✅ Imported {result['imported']} courses ({result['videos']} videos), "
+          f"skipped {result['skipped']} existing.")
+
+if __name__ == "__main__":
+    main()
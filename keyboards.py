@@ -27,8 +27,20 @@ def achievements_navigation_keyboard(page: int, total_pages: int):
     keyboard.append([InlineKeyboardButton("🏠 القائمة الرئيسية", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def articles_navigation_keyboard(page: int, total_pages: int):
+def _article_parts_row(callback_prefix: str, chunk: int, chunks: int):
+    """التنقل بين أجزاء المقال الطويل الواحد."""
+    row = []
+    if chunk > 0:
+        row.append(InlineKeyboardButton("⏪ الجزء السابق", callback_data=f"{callback_prefix}_{chunk-1}"))
+    if chunk < chunks - 1:
+        row.append(InlineKeyboardButton(f"الجزء التالي ({chunk+2}/{chunks}) ⏩", callback_data=f"{callback_prefix}_{chunk+1}"))
+    return row
+
+def articles_navigation_keyboard(page: int, total_pages: int, chunk: int = 0, chunks: int = 1):
     keyboard = []
+    parts_row = _article_parts_row(f"articles_page_{page}", chunk, chunks)
+    if parts_row:
+        keyboard.append(parts_row)
     nav_row = []
     if page > 0:
         nav_row.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"articles_page_{page-1}"))
@@ -39,6 +51,14 @@ def articles_navigation_keyboard(page: int, total_pages: int):
     keyboard.append([InlineKeyboardButton("🏠 القائمة الرئيسية", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
+def article_parts_keyboard(article_id: int, chunk: int, chunks: int):
+    keyboard = []
+    parts_row = _article_parts_row(f"article_open_{article_id}", chunk, chunks)
+    if parts_row:
+        keyboard.append(parts_row)
+    keyboard.append([InlineKeyboardButton("🏠 القائمة الرئيسية", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(keyboard)
+
 def courses_navigation_keyboard(page: int, total_pages: int):
     keyboard = []
     nav_row = []
@@ -1,23 +1,40 @@
 # main.py
 import logging
+from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
-    ConversationHandler, filters
+    ConversationHandler, ChatMemberHandler, InlineQueryHandler, TypeHandler, filters
 )
-from config import TOKEN
-from database import init_db
+from config import (
+    TOKEN, ADMIN_IDS, USER_FLUSH_INTERVAL, BOT_MODE, MAX_CONCURRENT_UPDATES, PERSISTENCE_INTERVAL,
+    PERSISTENCE_TRACKED_USERS, METRICS_HOST, METRICS_PORT, STATS_RECONCILE_INTERVAL,
+    FLOOD_RATE, FLOOD_BURST, FLOOD_TRACKED_USERS, FLOOD_INLINE_RATE, FLOOD_INLINE_BURST, ADMIN_DIGEST_INTERVAL
+)
+from database import init_db, close_db
+import async_db
+import broadcast
+import notifications
+import outbox
+from webhook import run_webhook
+from update_processor import PerUserUpdateProcessor
+from antiflood import AntiFlood
+from persistence import SQLitePersistence
+import metrics
+from metrics import InstrumentedRequest
 from handlers import start, about_bot, main_menu_callback, verify_subscription_callback, handle_text
-from courses import handle_course_selection, navigate_video
+from courses import handle_course_selection, navigate_video, inline_course_search
+from subscription import handle_chat_member_update
 from admin import (
-    admin_panel, admin_callback_handler, handle_admin_text,
-    new_course_start, new_course_name, receive_video, done_adding_videos,
+    admin_panel, admin_callback_handler, handle_admin_text, stats_command, referrals_command,
+    new_course_start, new_course_name, receive_video, done_adding_videos, rename_course, cancel_adding_course,
+    cancel_conversation,
     achievement_type, achievement_content, achievement_caption, skip_caption,
     article_title, article_content,
-    COURSE_NAME, RECEIVE_VIDEOS, ACHIEVEMENT_TYPE, ACHIEVEMENT_CONTENT, ACHIEVEMENT_CAPTION,
+    COURSE_NAME, RECEIVE_VIDEOS, COURSE_RENAME, ACHIEVEMENT_TYPE, ACHIEVEMENT_CONTENT, ACHIEVEMENT_CAPTION,
     ARTICLE_TITLE, ARTICLE_CONTENT
 )
 from achievements import show_achievements
-from articles import show_articles
+from articles import show_articles, search_command, search_callback
 import asyncio
 
 logging.basicConfig(
@@ -30,7 +47,24 @@ def main():
     init_db()
     logger.info("✅ Database initialized.")
 
-    app = Application.builder().token(TOKEN).build()
+    flood = AntiFlood(
+        FLOOD_RATE, FLOOD_BURST, FLOOD_TRACKED_USERS, exempt_ids=ADMIN_IDS,
+        inline_rate=FLOOD_INLINE_RATE, inline_burst=FLOOD_INLINE_BURST
+    )
+    update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES, hooks=[flood])
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(update_processor)
+        .persistence(SQLitePersistence(PERSISTENCE_INTERVAL, PERSISTENCE_TRACKED_USERS))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
+
+    # الحماية من الضغط المتكرر: قبل كل المعالجات (المجموعة -1)
+    app.add_handler(TypeHandler(Update, flood.check), group=-1)
 
     # محادثة إضافة كورس جديد
     course_conv = ConversationHandler(
@@ -40,9 +74,12 @@ def main():
             RECEIVE_VIDEOS: [
                 MessageHandler(filters.VIDEO, receive_video),
                 CommandHandler('done', done_adding_videos)
-            ]
+            ],
+            COURSE_RENAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, rename_course)]
         },
-        fallbacks=[CommandHandler('cancel', lambda u,c: u.message.reply_text("تم الإلغاء."))]
+        fallbacks=[CommandHandler('cancel', cancel_adding_course)],
+        name="course_conv",
+        persistent=True
     )
     app.add_handler(course_conv)
 
@@ -56,7 +93,9 @@ def main():
                 CommandHandler('skip', skip_caption)
             ]
         },
-        fallbacks=[CommandHandler('cancel', lambda u,c: u.message.reply_text("تم الإلغاء."))]
+        fallbacks=[CommandHandler('cancel', cancel_conversation)],
+        name="achievement_conv",
+        persistent=True
     )
     app.add_handler(achievement_conv)
 
@@ -67,13 +106,18 @@ def main():
             ARTICLE_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, article_title)],
             ARTICLE_CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, article_content)]
         },
-        fallbacks=[CommandHandler('cancel', lambda u,c: u.message.reply_text("تم الإلغاء."))]
+        fallbacks=[CommandHandler('cancel', cancel_conversation)],
+        name="article_conv",
+        persistent=True
     )
     app.add_handler(article_conv)
 
     # أوامر عامة
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("admin", admin_panel))
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("referrals", referrals_command))
+    app.add_handler(CommandHandler("search", search_command))
 
     # معالجات الكولباك
     app.add_handler(CallbackQueryHandler(main_menu_callback, pattern="^main_"))
@@ -82,19 +126,75 @@ def main():
     app.add_handler(CallbackQueryHandler(navigate_video, pattern="^(prev_video|next_video)$"))
     app.add_handler(CallbackQueryHandler(admin_callback_handler, pattern="^admin_"))
     app.add_handler(CallbackQueryHandler(show_articles, pattern="^articles_page_"))
+    app.add_handler(CallbackQueryHandler(search_callback, pattern="^(search_page_|article_open_)"))
     app.add_handler(CallbackQueryHandler(show_achievements, pattern="^achievements_page_"))
 
-    # معالجات النصوص
+    # البحث عن الكورسات بالوضع المضمّن
+    app.add_handler(InlineQueryHandler(inline_course_search))
+
+    # تحديثات أعضاء قناة الاشتراك (لإبطال ذاكرة الاشتراك)
+    app.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.CHAT_MEMBER))
+
+    # معالجات الرسائل (رسائل الأدمن أولاً: في المجموعة الواحدة يعمل أول معالج مطابق فقط)
+    app.add_handler(MessageHandler(filters.User(ADMIN_IDS) & ~filters.COMMAND, handle_admin_text))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_text))
 
     app.add_error_handler(error_handler)
 
+    # القياسات: زمن كل معالج + حالة طابور التحديثات
+    metrics.instrument_handlers(app)
+    metrics.register_collector(lambda: [
+        (f'bot_updates_{name}', 'gauge', {}, value) for name, value in update_processor.stats().items()
+    ] + [('bot_update_queue_size', 'gauge', {}, app.update_queue.qsize())])
+    metrics.register_collector(lambda: [
+        (f'bot_flood_{name}', 'gauge', {}, value) for name, value in flood.stats().items()
+    ])
+    metrics.register_collector(lambda: [
+        (f'bot_outbox_{name}', 'gauge', {}, value) for name, value in outbox.default.stats().items()
+    ])
+    metrics.register_collector(lambda: [
+        (f'bot_admin_notifications_{name}', 'gauge', {}, value) for name, value in notifications.stats().items()
+    ])
+
+    # كتابة تحديثات المستخدمين المؤجلة على دفعات
+    app.job_queue.run_repeating(flush_user_writes, interval=USER_FLUSH_INTERVAL, first=USER_FLUSH_INTERVAL)
+    # مطابقة عدادات الإحصائيات مع الجداول (تصحيح أي انحراف)
+    app.job_queue.run_repeating(reconcile_stats, interval=STATS_RECONCILE_INTERVAL, first=STATS_RECONCILE_INTERVAL)
+    # ملخص إشعارات الأدمن
+    app.job_queue.run_repeating(notifications.send_digest, interval=ADMIN_DIGEST_INTERVAL, first=ADMIN_DIGEST_INTERVAL)
+
     logger.info("🚀 Bot is starting...")
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app, allowed_updates=Update.ALL_TYPES))
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
+    async_db.shutdown()
+    close_db()
+
+async def post_init(app: Application):
+    if METRICS_PORT:
+        await metrics.start_server(METRICS_HOST, METRICS_PORT)
+    await broadcast.resume_broadcasts(app.bot)
+
+async def post_stop(app: Application):
+    await broadcast.stop_all()
+    await notifications.flush(app.bot)  # عدم فقد الأحداث المؤجلة عند الإغلاق
+    await outbox.stop()
+    await metrics.stop_server()
+    await async_db.flush_pending_users()
+
+async def flush_user_writes(context):
+    await async_db.flush_pending_users()
+
+async def reconcile_stats(context):
+    drift = await async_db.reconcile_stats()
+    if drift:
+        logger.warning(f"⚠️ Stats counters drifted, corrected: {drift}")
 
 async def error_handler(update, context):
     logger.error("Exception while handling an update:", exc_info=context.error)
+    notifications.notify(context.bot, notifications.FAILURE,
+                         f"⚠️ {type(context.error).__name__}: {context.error}"[:200])
 
 if __name__ == "__main__":
     main()
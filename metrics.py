@@ -0,0 +1,248 @@
+# metrics.py
+# قياسات داخلية بصيغة Prometheus: زمن المعالجات، زمن استعلامات قاعدة البيانات،
+# طلبات Bot API وأخطاؤها، ونسب إصابة الذواكر. تُعرض على /metrics عبر HTTP محلي
+# وتُلخص للأدمن بالأمر /stats.
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = []
+_collectors: List[Callable[[], List[Tuple[str, str, dict, float]]]] = []
+STARTED_AT = time.time()
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def _escape_label(value) -> str:
+    # صيغة Prometheus النصية: \ و " وسطر جديد تُهرّب داخل قيمة الوسم
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}  # key -> [counts per bucket..., +Inf, sum, count]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 3)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def summary(self) -> Dict[tuple, dict]:
+        """العدد والمتوسط وتقدير p50/p95 (من حدود الدلاء) لكل مجموعة تسميات."""
+        result = {}
+        with self._lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        for key, series in items:
+            count = series[-1]
+            result[key] = {
+                'count': count,
+                'mean': series[-2] / count if count else 0.0,
+                'p50': self._quantile(series, 0.5),
+                'p95': self._quantile(series, 0.95),
+            }
+        return result
+
+    def _quantile(self, series, q: float) -> float:
+        target = series[-1] * q
+        running = 0
+        for i, bound in enumerate(self.buckets):
+            running += series[i]
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for key, series in items:
+            running = 0
+            for i, bound in enumerate(self.buckets):
+                running += series[i]
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {running}")
+            running += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+def register_collector(collector: Callable[[], List[Tuple[str, str, dict, float]]]):
+    """دالة تُرجع قائمة (name, type, labels, value) تُحسب عند كل عرض (للقيم اللحظية)."""
+    _collectors.append(collector)
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    seen = set()
+    for collector in _collectors:
+        for name, type_, labels, value in collector():
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {type_}")
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+# --- القياسات ---
+HANDLER_LATENCY = Histogram('bot_handler_seconds', 'Handler callback latency')
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Handler callbacks that raised')
+DB_QUERY_LATENCY = Histogram('bot_db_query_seconds', 'database.py function execution time')
+DB_QUEUE_WAIT = Histogram('bot_db_queue_wait_seconds', 'Time spent waiting for a DB thread')
+API_LATENCY = Histogram('bot_api_request_seconds', 'Outbound Bot API request latency')
+API_CALLS = Counter('bot_api_requests_total', 'Outbound Bot API requests')
+API_ERRORS = Counter('bot_api_errors_total', 'Outbound Bot API errors')
+FLOOD_REJECTED = Counter('bot_flood_rejected_total', 'Updates dropped by the anti-flood middleware')
+
+def _cache_metrics():
+    import cache
+    samples = []
+    for name, stats in cache.all_stats().items():
+        samples.append(('bot_cache_hits_total', 'counter', {'cache': name}, stats['hits']))
+        samples.append(('bot_cache_misses_total', 'counter', {'cache': name}, stats['misses']))
+        samples.append(('bot_cache_size', 'gauge', {'cache': name}, stats['size']))
+        samples.append(('bot_cache_hit_ratio', 'gauge', {'cache': name}, stats['hit_ratio']))
+    return samples
+
+register_collector(_cache_metrics)
+
+# --- المعالجات ---
+def _handler_labels(handler) -> dict:
+    callback = handler.callback
+    labels = {'handler': getattr(callback, '__name__', type(callback).__name__)}
+    pattern = getattr(handler, 'pattern', None)
+    if pattern is not None:
+        labels['pattern'] = getattr(pattern, 'pattern', str(pattern))
+    return labels
+
+def _timed(callback, labels: dict):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, **labels)
+    return wrapper
+
+def instrument_handlers(app):
+    """تغليف كل معالج مسجل (بما فيها معالجات ConversationHandler) بقياس الزمن."""
+    from telegram.ext import ConversationHandler
+
+    def wrap(handler):
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points + handler.fallbacks:
+                wrap(inner)
+            for handlers in handler.states.values():
+                for inner in handlers:
+                    wrap(inner)
+            return
+        handler.callback = _timed(handler.callback, _handler_labels(handler))
+
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            wrap(handler)
+
+# --- طلبات Bot API ---
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest يسجل عدد وزمن وأخطاء كل طلب إلى Bot API (بما فيها RetryAfter)."""
+
+    async def post(self, url: str, *args, **kwargs):
+        method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        API_CALLS.inc(method=method)
+        try:
+            return await super().post(url, *args, **kwargs)
+        except RetryAfter:
+            API_ERRORS.inc(method=method, error='RetryAfter')
+            raise
+        except TelegramError as e:
+            API_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, method=method)
+
+# --- خادم HTTP ---
+_server = None
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        path = request_line.split()[1].decode() if len(request_line.split()) > 1 else '/'
+        if path.startswith('/metrics'):
+            body, status = render().encode(), '200 OK'
+        else:
+            body, status = b'not found\n', '404 Not Found'
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+async def start_server(host: str, port: int):
+    global _server
+    _server = await asyncio.start_server(_serve, host, port)
+    logger.info(f"📈 Metrics on http://{host}:{port}/metrics")
+
+async def stop_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
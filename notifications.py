@@ -0,0 +1,94 @@
+# notifications.py
+# تجميع إشعارات الأدمن: الأحداث تُسجل في الذاكرة دون أي طلب لتيليجرام في مسار المستخدم،
+# وتُرسل كملخص دوري من job_queue. عند الحجم المنخفض (أقل من ADMIN_DIGEST_IMMEDIATE_LIMIT حدثاً
+# في الفترة) يُرسل الحدث فوراً في الخلفية، فلا يتأخر الإشعار الفردي حتى الملخص التالي.
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+from telegram.constants import MessageLimit
+from telegram.error import TelegramError
+
+import config
+import outbox
+
+logger = logging.getLogger(__name__)
+
+# أنواع الأحداث
+REFERRAL, MILESTONE, FAILURE = 'referral', 'milestone', 'failure'
+KIND_LABELS = {
+    REFERRAL: "✅ مدعوون جدد",
+    MILESTONE: "🎉 أكملوا الدعوات",
+    FAILURE: "⚠️ أخطاء",
+}
+
+_events = deque(maxlen=config.ADMIN_DIGEST_MAX_LINES)  # آخر الأحداث المؤجلة للعرض بالتفصيل
+_pending = Counter()      # عدد الأحداث المؤجلة لكل نوع (تشمل ما سقط من _events)
+_window_count = 0         # الأحداث منذ آخر ملخص (للتحول من الفوري إلى الملخص)
+_window_started = time.monotonic()
+_tasks = set()            # إرسالات فورية جارية
+_stats = Counter()
+
+def notify(bot, kind: str, text: str):
+    """تسجيل حدث للأدمن. لا ينتظر أي إرسال، فيمكن استدعاؤه من داخل معالجات المستخدمين."""
+    global _window_count
+    _window_count += 1
+    _stats[f'events_{kind}'] += 1
+    if _window_count <= config.ADMIN_DIGEST_IMMEDIATE_LIMIT:
+        task = asyncio.get_running_loop().create_task(_send(bot, text))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        _stats['immediate'] += 1
+        return
+    _events.append(text)
+    _pending[kind] += 1
+
+def _digest_text(minutes: int) -> str:
+    total = sum(_pending.values())
+    lines = [f"📬 ملخص الإشعارات: {total} حدث خلال {minutes} د", ""]
+    for kind, label in KIND_LABELS.items():
+        if _pending[kind]:
+            lines.append(f"{label}: {_pending[kind]}")
+    lines.append("")
+    lines.extend(_events)
+    hidden = total - len(_events)
+    if hidden > 0:
+        lines.append(f"... و{hidden} أحداث أقدم")
+    return "\n".join(lines)[:MessageLimit.MAX_TEXT_LENGTH]
+
+async def flush(bot):
+    """إرسال الأحداث المؤجلة كرسالة واحدة وبدء فترة جديدة."""
+    global _window_count, _window_started
+    minutes = max(1, round((time.monotonic() - _window_started) / 60))
+    _window_count = 0
+    _window_started = time.monotonic()
+    if not _pending:
+        return
+    text = _digest_text(minutes)
+    _events.clear()
+    _pending.clear()
+    if await _send(bot, text):
+        _stats['digests'] += 1
+
+async def send_digest(context):
+    await flush(context.bot)
+
+async def _send(bot, text: str) -> bool:
+    chat_id = config.ADMIN_IDS[0]
+    try:
+        await outbox.send(chat_id, lambda: bot.send_message(chat_id=chat_id, text=text), outbox.NOTIFICATION)
+        return True
+    except TelegramError as e:
+        _stats['send_failed'] += 1
+        logger.warning(f"❌ Admin notification failed: {e}")
+        return False
+
+def stats() -> dict:
+    return {
+        'pending': sum(_pending.values()),
+        'immediate': _stats['immediate'],
+        'digests': _stats['digests'],
+        'send_failed': _stats['send_failed'],
+        **{f'events_{kind}': _stats[f'events_{kind}'] for kind in KIND_LABELS},
+    }
@@ -0,0 +1,227 @@
+# outbox.py
+# مُجدول موحد لكل الرسائل الصادرة إلى Bot API: مسارات أولوية (ردود تفاعلية > إشعارات > إذاعة)،
+# حد عام للبوت كله وحد لكل دردشة، وإعادة المحاولة تلقائياً عند RetryAfter.
+# رسائل الدردشة الواحدة تُرسل واحدة تلو الأخرى بترتيب إرسالها.
+#
+# الاستخدام: كل إرسال يُمرر كدالة تُنشئ الطلب (وليس الطلب نفسه) حتى يمكن إعادته:
+#   await outbox.send(chat_id, lambda: bot.send_message(chat_id, text), outbox.INTERACTIVE)
+# الدالة أي coroutine factory، لذا يمكن اختبار Outbox ببوت وهمي دون تيليجرام (benchmarks/outbox_harness.py).
+#
+# حد الدردشة في تيليجرام على الرسائل المرسلة فقط: التعديل والحذف تمر عبر outbox.edit،
+# فتحافظ على ترتيب الدردشة وتحترم إيقاف RetryAfter والحد العام، لكن لا تُخصم من دلو الدردشة.
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram.error import RetryAfter
+
+import config
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# مسارات الأولوية (الأصغر يُرسل أولاً)
+INTERACTIVE, NOTIFICATION, BROADCAST = range(3)
+LANE_NAMES = {INTERACTIVE: 'interactive', NOTIFICATION: 'notification', BROADCAST: 'broadcast'}
+
+class _Item:
+    __slots__ = ('chat_id', 'factory', 'lane', 'future', 'seq', 'cost', 'attempts')
+
+    def __init__(self, chat_id, factory, lane, future, seq, cost):
+        self.chat_id = chat_id
+        self.factory = factory
+        self.lane = lane
+        self.future = future
+        self.seq = seq
+        self.cost = cost  # رموز من دلو الدردشة: 1 لرسالة جديدة، 0 لتعديل/حذف
+        self.attempts = 0
+
+class _Chat:
+    """حالة دردشة: دلوها، والطلب الحالي (head)، وطابور FIFO لما بعده.
+    طلب واحد فقط لكل دردشة في الطابور العام أو قيد الإرسال، فتصل رسائلها بترتيب إرسالها."""
+    __slots__ = ('bucket', 'head', 'queue')
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.head: Optional[_Item] = None
+        self.queue: "deque[_Item]" = deque()
+
+class Outbox:
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float,
+                 concurrency: int = 32, max_attempts: int = 3, max_chats: int = 10000):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[Any, _Chat]" = OrderedDict()
+        self._seq = itertools.count()  # ترتيب الوصول داخل المسار الواحد
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._global: Optional[TokenBucket] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running = set()
+        self.queued = {lane: 0 for lane in LANE_NAMES}
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+
+    # --- الواجهة ---
+    async def send(self, chat_id, factory: Callable[[], Awaitable[Any]], lane: int = INTERACTIVE,
+                   cost: float = 1.0):
+        """جدولة الطلب وانتظار نتيجته. أخطاء تيليجرام (غير RetryAfter) تصل للمستدعي كما هي."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Item(chat_id, factory, lane, future, next(self._seq), cost))
+        return await future
+
+    async def stop(self):
+        """إيقاف المُجدول وإلغاء ما لم يُرسل بعد."""
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, *self._running, return_exceptions=True)
+        while not self._queue.empty():
+            _, _, item = self._queue.get_nowait()
+            self.queued[item.lane] -= 1
+            item.future.cancel()
+        for chat in self._chats.values():
+            for item in chat.queue:
+                item.future.cancel()
+            if chat.head is not None:
+                chat.head.future.cancel()
+        self._chats.clear()
+        self._dispatcher = None
+
+    def stats(self) -> dict:
+        stats = {f'queued_{LANE_NAMES[lane]}': count for lane, count in self.queued.items()}
+        stats.update({
+            'held': sum(len(chat.queue) for chat in self._chats.values()),
+            'in_flight': len(self._running),
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'tracked_chats': len(self._chats),
+        })
+        return stats
+
+    # --- التنفيذ ---
+    def _ensure_started(self):
+        # يُنشأ داخل حلقة الأحداث عند أول استخدام
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.PriorityQueue()
+            self._global = TokenBucket(self.global_rate)
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch(), name="outbox")
+
+    def _enqueue(self, item: _Item):
+        self.queued[item.lane] += 1
+        self._queue.put_nowait((item.lane, item.seq, item))
+
+    def _chat(self, chat_id) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst))
+            if len(self._chats) > self.max_chats:
+                # حذف أقدم الدردشات الخاملة فقط (دردشة لها طلبات معلقة تبقى)
+                idle = [key for key, old in itertools.islice(self._chats.items(), 64) if old.head is None and key != chat_id]
+                for key in idle[:len(self._chats) - self.max_chats]:
+                    del self._chats[key]
+        else:
+            self._chats.move_to_end(chat_id)
+        return chat
+
+    def _advance(self, chat: _Chat):
+        """انتهى طلب الدردشة الحالي: يدخل التالي في طابورها إلى الطابور العام بترتيبه الأصلي."""
+        chat.head = chat.queue.popleft() if chat.queue else None
+        if chat.head is not None:
+            self._enqueue(chat.head)
+
+    def _defer(self, item: _Item, delay: float):
+        """إعادة رأس الدردشة إلى الطابور بعد delay ثانية؛ بقية طلباتها تنتظر خلفه، فتتوقف الدردشة كلها
+        دون حجز المُجدول عن الدردشات الأخرى."""
+        def requeue():
+            if self._dispatcher is None:  # أُوقف المُجدول أثناء الانتظار
+                item.future.cancel()
+                return
+            self._enqueue(item)
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _dispatch(self):
+        while True:
+            _, _, item = await self._queue.get()
+            self.queued[item.lane] -= 1
+            chat = self._chat(item.chat_id)
+            if chat.head is None:
+                chat.head = item
+            elif chat.head is not item:
+                # للدردشة طلب سابق لم ينته: ينتظر دوره في طابورها
+                chat.queue.append(item)
+                continue
+            if item.future.done():  # المستدعي أُلغي
+                self._advance(chat)
+                continue
+            # cost=0: يمر فوراً إلا إذا كانت الدردشة موقوفة بـ RetryAfter
+            if not chat.bucket.try_acquire(item.cost):
+                self._defer(item, chat.bucket.wait_time(item.cost))
+                continue
+            await self._global.acquire()
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._execute(item, chat))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, item: _Item, chat: _Chat):
+        try:
+            item.attempts += 1
+            result = await item.factory()
+        except RetryAfter as e:
+            # حد هذه الدردشة تجاوز: إيقافها فقط وإعادة المحاولة بعد المدة المطلوبة
+            chat.bucket.pause(e.retry_after)
+            if item.attempts < self.max_attempts:
+                self.retries += 1
+                logger.warning(f"⏳ RetryAfter {e.retry_after}s for chat {item.chat_id}, retrying")
+                self._defer(item, e.retry_after)
+            else:
+                self.failed += 1
+                self._settle(item, exception=e)
+                self._advance(chat)
+        except Exception as e:
+            self.failed += 1
+            self._settle(item, exception=e)
+            self._advance(chat)
+        else:
+            self.sent += 1
+            self._settle(item, result=result)
+            self._advance(chat)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _settle(item: _Item, result=None, exception: BaseException = None):
+        if item.future.done():
+            return
+        if exception is not None:
+            item.future.set_exception(exception)
+        else:
+            item.future.set_result(result)
+
+# المُجدول المشترك لكل وحدات البوت
+default = Outbox(
+    config.OUTBOX_GLOBAL_RATE, config.OUTBOX_CHAT_RATE, config.OUTBOX_CHAT_BURST,
+    concurrency=config.OUTBOX_CONCURRENCY,
+)
+
+async def send(chat_id, factory: Callable[[], Awaitable[Any]], lane: int = INTERACTIVE):
+    """رسالة جديدة: تُخصم من حد الدردشة."""
+    return await default.send(chat_id, factory, lane)
+
+async def edit(chat_id, factory: Callable[[], Awaitable[Any]], lane: int = INTERACTIVE):
+    """تعديل أو حذف رسالة قائمة: بترتيب الدردشة لكن دون الخصم من حدها."""
+    return await default.send(chat_id, factory, lane, cost=0)
+
+async def stop():
+    await default.stop()
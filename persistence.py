@@ -0,0 +1,153 @@
+# persistence.py
+# حفظ user_data وحالات ConversationHandler في courses.db حتى لا تضيع عند إعادة التشغيل.
+# - user_data يُحمّل عند أول تحديث من المستخدم (refresh_user_data) وليس كله عند بدء التشغيل.
+# - لا يُكتب إلا ما تغيّر فعلاً منذ آخر حفظ، وكل التغييرات في دورة واحدة تُكتب بمعاملة واحدة.
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import async_db as db
+
+logger = logging.getLogger(__name__)
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, update_interval: float = 30, max_tracked_users: int = 50000):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        # مستخدمون حُمّلت بياناتهم -> بصمة آخر نسخة محفوظة (None = لا نسخة)، الأقدم استخداماً يُحذف أولاً.
+        # المحذوف يُعاد تحميله عند تحديثه التالي (refresh_user_data) دون الكتابة فوق ما في الذاكرة.
+        self.max_tracked_users = max_tracked_users
+        self._loaded: "OrderedDict[int, Optional[int]]" = OrderedDict()
+        self._dirty_users: Dict[int, str] = {}
+        self._dropped_users = set()
+        self._dirty_conversations: Dict[tuple, Optional[str]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+    # --- user_data ---
+    async def get_user_data(self) -> Dict[int, dict]:
+        # لا شيء عند بدء التشغيل: كل مستخدم يُحمّل عند أول تحديث منه
+        return {}
+
+    def _track(self, user_id: int, saved_hash: Optional[int]):
+        self._loaded[user_id] = saved_hash
+        self._loaded.move_to_end(user_id)
+        while len(self._loaded) > self.max_tracked_users:
+            self._loaded.popitem(last=False)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded:
+            self._loaded.move_to_end(user_id)
+            return
+        # يُعلَّم كمُحمّل بعد نجاح القراءة فقط: إن فشلت لا تُكتب النسخة الناقصة فوق المحفوظة
+        raw = await db.get_user_state(user_id)
+        self._track(user_id, None if raw is None else hash(raw))
+        if raw is None:
+            return
+        # لا نستبدل ما كُتب في الذاكرة قبل اكتمال التحميل
+        for key, value in json.loads(raw).items():
+            user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if user_id not in self._loaded:
+            # لم تُحمّل بياناته المحفوظة بعد، فلا نكتب فوقها نسخة فارغة
+            return
+        raw = _dumps(data)
+        if self._loaded[user_id] == hash(raw):
+            return
+        self._dirty_users[user_id] = raw
+        self._dropped_users.discard(user_id)
+        await self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_users.pop(user_id, None)
+        if user_id in self._loaded:
+            self._loaded[user_id] = None
+        self._dropped_users.add(user_id)
+        await self._schedule_write()
+
+    # --- المحادثات ---
+    async def get_conversations(self, name: str) -> dict:
+        conversations = {}
+        for row in await db.get_conversation_states(name):
+            conversations[tuple(json.loads(row['key']))] = json.loads(row['state'])
+        return conversations
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        state = None if new_state is None else _dumps(new_state)
+        self._dirty_conversations[(name, _dumps(list(key)))] = state
+        await self._schedule_write()
+
+    # --- الكتابة على دفعات ---
+    async def _schedule_write(self):
+        # كل استدعاءات update_* في نفس دورة update_persistence تُجمع في كتابة واحدة:
+        # المهمة تبدأ بعد أن تضيف كل الاستدعاءات المتزامنة تغييراتها.
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_dirty())
+        await asyncio.shield(self._write_task)
+
+    async def _write_dirty(self):
+        users, self._dirty_users = self._dirty_users, {}
+        dropped, self._dropped_users = self._dropped_users, set()
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        if not (users or dropped or conversations):
+            return
+        try:
+            await db.save_states(
+                list(users.items()),
+                list(dropped),
+                [(name, key, state) for (name, key), state in conversations.items()],
+            )
+        except Exception:
+            # إعادة التغييرات إلى الانتظار (دون الكتابة فوق ما هو أحدث) لتُحاول في الدورة التالية
+            for user_id, raw in users.items():
+                self._dirty_users.setdefault(user_id, raw)
+            self._dropped_users |= dropped - set(self._dirty_users)
+            for key, state in conversations.items():
+                self._dirty_conversations.setdefault(key, state)
+            raise
+        for user_id, raw in users.items():
+            if user_id in self._loaded:
+                self._loaded[user_id] = hash(raw)
+        logger.debug(f"Persisted {len(users)} user_data, {len(conversations)} conversation states")
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await self._write_dirty()
+
+    # --- بيانات غير محفوظة ---
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
@@ -0,0 +1,55 @@
+# ratelimit.py
+# دلو رموز (token bucket) غير متزامن لضبط معدل الإرسال إلى Bot API.
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate                      # رموز في الثانية
+        self.capacity = capacity or rate      # أقصى دفعة مسموحة
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """محاولة فورية دون انتظار."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        # القفل يضمن خدمة المنتظرين بالترتيب
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """الثواني المتبقية حتى يتوفر tokens رمز (0 إن كانت متوفرة الآن)."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now + tokens / self.rate
+        self._refill(now)
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """إيقاف الدلو مؤقتاً (مثلاً عند RetryAfter من تيليجرام)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
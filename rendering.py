@@ -0,0 +1,53 @@
+# rendering.py
+# تحويل المقال إلى رسائل جاهزة للإرسال (HTML مُهرّب) مقسمة ضمن حد طول رسالة تيليجرام.
+# يُنفّذ مرة واحدة عند حفظ المقال، والعرض يقرأ الجزء الجاهز فقط.
+import html
+import re
+
+from telegram.constants import MessageLimit
+
+# تيليجرام يحسب الحد بوحدات UTF-16 (الإيموجي وأحرف خارج BMP = وحدتان)، فكل الأطوال هنا بهذه الوحدات
+CHUNK_LIMIT = MessageLimit.MAX_TEXT_LENGTH
+TITLE_LIMIT = 256
+
+# حدود التقسيم المفضلة بالترتيب: فقرة، سطر، نهاية جملة، مسافة
+_BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+def utf16_len(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+def _utf16_prefix(text: str, limit: int) -> str:
+    """أطول بداية للنص لا تتجاوز limit وحدة UTF-16 (دون قطع حرف من وحدتين)."""
+    return text.encode('utf-16-le')[:limit * 2].decode('utf-16-le', errors='ignore')
+
+def split_text(text: str, limit: int) -> list:
+    """تقسيم النص إلى أجزاء لا تتجاوز limit وحدة UTF-16، عند أقرب حد آمن قبل الحد."""
+    chunks = []
+    while utf16_len(text) > limit:
+        max_cut = len(_utf16_prefix(text, limit))  # الحد بعدد أحرف بايثون
+        cut = -1
+        for boundary in _BOUNDARIES:
+            cut = text.rfind(boundary, max_cut // 2, max_cut)
+            if cut != -1:
+                cut += len(boundary)
+                break
+        if cut == -1:
+            cut = max_cut  # كلمة أطول من نصف الحد: قطع مباشر
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+def chunk_length(chunk: str) -> int:
+    """طول الجزء الجاهز كما يحسبه تيليجرام (بعد إزالة الوسوم وفك التهريب)."""
+    return utf16_len(html.unescape(re.sub(r'</?b>', '', chunk)))
+
+def render_article(title: str, content: str) -> list:
+    """أجزاء المقال بصيغة HTML، والعنوان بخط عريض في أول جزء.
+    الطول يُحسب على النص قبل التهريب لأن تيليجرام يحسب الحد على النص الظاهر."""
+    header = f"📖 {_utf16_prefix(title, TITLE_LIMIT)}"
+    pieces = split_text(content, CHUNK_LIMIT - utf16_len(header) - 2)
+    chunks = [html.escape(piece, quote=False) for piece in pieces]
+    chunks[0] = f"<b>{html.escape(header, quote=False)}</b>\n\n{chunks[0]}"
+    return chunks
@@ -3,68 +3,97 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
-from database import get_user, set_referrer, increment_invites, mark_invite_rewarded, set_invite_message_shown
-from database import get_user, add_or_update_user  # لإضافة مستخدم
-from config import REQUIRED_CHANNEL, ADMIN_IDS
+import async_db as db
+import notifications
+import outbox
+from cache import TTLCache, MISSING
+from config import REQUIRED_CHANNEL
 import config
 
 logger = logging.getLogger(__name__)
 
+# ذاكرة نتائج get_chat_member بمفتاح (القناة، المستخدم)
+membership_cache = TTLCache('membership', config.MEMBERSHIP_CACHE_SIZE, config.MEMBERSHIP_CACHE_TTL)
+
 async def is_user_subscribed(bot, user_id: int, channel: str) -> bool:
+    cached = membership_cache.get((channel, user_id))
+    if cached is not MISSING:
+        return cached
     try:
         member = await bot.get_chat_member(chat_id=channel, user_id=user_id)
-        return member.status not in ['left', 'kicked']
     except TelegramError as e:
+        # لا نخزن الأخطاء حتى يُعاد المحاولة في الطلب التالي
         logger.error(f"❌ Subscription check failed for {user_id}: {e}")
         return False
+    subscribed = member.status not in ['left', 'kicked']
+    ttl = config.MEMBERSHIP_CACHE_TTL if subscribed else config.MEMBERSHIP_CACHE_NEGATIVE_TTL
+    membership_cache.set((channel, user_id), subscribed, ttl)
+    return subscribed
+
+def invalidate_membership(user_id: int, channel: str = REQUIRED_CHANNEL):
+    membership_cache.invalidate((channel, user_id))
+
+async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """تحديث الذاكرة من تحديثات chat_member (يتطلب أن يكون البوت مشرفاً في القناة)."""
+    member_update = update.chat_member
+    chat = member_update.chat
+    if not chat.username or chat.username.lower() != REQUIRED_CHANNEL.lstrip('@').lower():
+        return
+    member = member_update.new_chat_member
+    subscribed = member.status not in ['left', 'kicked']
+    ttl = config.MEMBERSHIP_CACHE_TTL if subscribed else config.MEMBERSHIP_CACHE_NEGATIVE_TTL
+    membership_cache.set((REQUIRED_CHANNEL, member.user.id), subscribed, ttl)
 
 async def check_subscription_and_invite(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
+    user_data = await db.get_user(user_id)
 
     if user_data.get('blocked', 0):
-        await update.effective_message.reply_text("⛔ لقد تم حظرك من استخدام البوت.")
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
+            "⛔ لقد تم حظرك من استخدام البوت."))
         return False
 
     subscribed = await is_user_subscribed(context.bot, user_id, REQUIRED_CHANNEL)
     if not subscribed:
         keyboard = [[InlineKeyboardButton("✅ تحقق مني", callback_data="verify_subscription")]]
-        await update.effective_message.reply_text(
+        await outbox.send(update.effective_chat.id, lambda: update.effective_message.reply_text(
             "❗ يجب الاشتراك في القناة أولاً لاستخدام البوت.\n"
             f"🔗 رابط القناة: https://t.me/{REQUIRED_CHANNEL[1:]}\n\n"
             "بعد الاشتراك، اضغط على زر 'تحقق مني'.",
             reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        ))
         return False
 
     # تحديث الاشتراك إذا كان جديداً
     if not user_data.get('is_subscribed', 0):
-        from database import get_db
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('UPDATE users SET is_subscribed = 1 WHERE user_id = ?', (user_id,))
-            conn.commit()
+        await db.set_user_subscribed(user_id, True)
         user_data['is_subscribed'] = 1
 
     # مكافأة الداعي إذا كان مدعواً ولم يكافأ بعد
     referrer_id = user_data.get('referrer_id')
     if referrer_id and not user_data.get('invite_rewarded', 0):
-        referrer = get_user(referrer_id)
+        referrer = await db.get_user(referrer_id)
         if referrer and not referrer.get('blocked', 0) and referrer_id != user_id:
-            increment_invites(referrer_id)
-            mark_invite_rewarded(user_id)
-            await context.bot.send_message(
-                chat_id=ADMIN_IDS[0],
-                text=f"✅ تم اشتراك مدعو جديد!\n"
-                     f"الداعي: {referrer_id}\n"
-                     f"المدعو: {user_id}\n"
-                     f"إجمالي دعوات الداعي الآن: {referrer.get('invites_count', 0) + 1}"
+            await db.increment_invites(referrer_id)
+            await db.mark_invite_rewarded(user_id)
+            invites = referrer.get('invites_count', 0) + 1
+            # إشعار الأدمن يُجمّع في ملخص دوري بدل رسالة لكل مدعو
+            notifications.notify(
+                context.bot, notifications.REFERRAL,
+                f"✅ الداعي {referrer_id} ← المدعو {user_id} (إجمالي دعواته: {invites})"
             )
-            if (referrer.get('invites_count', 0) + 1 >= 5) or referrer.get('exempt_from_invites', 0):
-                await context.bot.send_message(
-                    chat_id=referrer_id,
-                    text="🎉 تهانينا! لقد أكملت دعوة 5 أشخاص وأصبح بإمكانك استخدام البوت بحرية."
-                )
+            if invites >= 5 or referrer.get('exempt_from_invites', 0):
+                if invites == 5:
+                    notifications.notify(context.bot, notifications.MILESTONE, f"🎉 الداعي {referrer_id} أكمل 5 دعوات")
+                try:
+                    await outbox.send(referrer_id, lambda: context.bot.send_message(
+                        chat_id=referrer_id,
+                        text="🎉 تهانينا! لقد أكملت دعوة 5 أشخاص وأصبح بإمكانك استخدام البوت بحرية."
+                    ), outbox.NOTIFICATION)
+                except TelegramError as e:
+                    # الداعي حظر البوت مثلاً: لا يمنع المدعو من المتابعة
+                    notifications.notify(context.bot, notifications.FAILURE,
+                                         f"⚠️ تعذر تهنئة الداعي {referrer_id}: {e}")
 
     return True  # مستوفي الشروط
 
@@ -74,6 +103,6 @@ async def handle_referral(update: Update, context: ContextTypes.DEFAULT_TYPE):
         referrer_id = args[0][4:]
         try:
             referrer_id = int(referrer_id)
-            set_referrer(update.effective_user.id, referrer_id)
+            await db.set_referrer(update.effective_user.id, referrer_id)
         except ValueError:
             pass
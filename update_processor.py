@@ -0,0 +1,103 @@
+# update_processor.py
+# معالجة التحديثات بالتوازي بين المستخدمين مع الحفاظ على ترتيب تحديثات المستخدم الواحد،
+# حتى لا تتسابق حقول user_data (مثل current_course و video_index) بين ضغطتين متتاليتين.
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """تحديثات مستخدمين مختلفين تعمل بالتوازي، وتحديثات نفس المستخدم (أو الدردشة) بالترتيب.
+    max_concurrent_updates يحد التحديثات الجارية فعلياً فقط: التحديث لا يحجز مكاناً إلا بعد أن يحين
+    دوره عند مستخدمه، فلا يستطيع مستخدم واحد يضغط بسرعة أن يملأ الأماكن بتحديثات منتظرة.
+    لا يُسقط أي تحديث: المنتظرة تنتظر على قفل مستخدمها فقط (والضغط المتكرر يرفضه AntiFlood)."""
+
+    def __init__(self, max_concurrent_updates: int, hooks=()):
+        super().__init__(max_concurrent_updates)
+        # كائنات بها update_received(update) و update_done(update)، تُستدعى عند وصول التحديث
+        # (قبل انتظار دوره) وعند انتهائه (مثل AntiFlood لدمج الضغطات المكررة)
+        self.hooks = list(hooks)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, int] = {}  # عدد التحديثات (الجارية + المنتظرة) لكل مفتاح
+        self.in_flight = 0                   # تحديثات قيد التنفيذ فعلياً
+        self.waiting = 0                     # تحديثات تنتظر انتهاء تحديث سابق لنفس المستخدم
+        self.max_waiting = 0
+        self.processed = 0
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # بدون سيمافور الأساس: يُؤخذ المكان في _run بعد قفل المستخدم
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        for hook in self.hooks:
+            hook.update_received(update)
+        try:
+            await self._process(update, coroutine)
+        finally:
+            for hook in self.hooks:
+                hook.update_done(update)
+
+    async def _process(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._pending[key] = self._pending.get(key, 0) + 1
+        try:
+            if lock.locked():
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+                try:
+                    await lock.acquire()
+                finally:
+                    self.waiting -= 1
+            else:
+                await lock.acquire()
+            try:
+                await self._run(coroutine)
+            finally:
+                lock.release()
+        finally:
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                del self._locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                await coroutine
+            finally:
+                self.in_flight -= 1
+                self.processed += 1
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrent_updates': self.max_concurrent_updates,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'active_users': len(self._pending),
+            'processed': self.processed,
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
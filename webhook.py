@@ -0,0 +1,123 @@
+# webhook.py
+# وضع الـ Webhook: خادم tornado مدمج يستقبل التحديثات من تيليجرام ويضعها في update_queue،
+# مع نقطة فحص صحة /health. يُفعّل عبر BOT_MODE = "webhook" في config.py.
+#
+# للتجربة محلياً (بدون تيليجرام) أرسل تحديثاً مسجلاً بصيغة JSON إلى الخادم:
+#   python webhook.py replay update.json [http://127.0.0.1:8443/telegram]
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import ssl
+import sys
+import urllib.request
+
+import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+def _make_server(app):
+    import tornado.httpserver
+    import tornado.web
+    from telegram import Update
+
+    class UpdateHandler(tornado.web.RequestHandler):
+        async def post(self):
+            token = self.request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(token.encode(), config.WEBHOOK_SECRET.encode()):
+                self.set_status(403)
+                return
+            try:
+                data = json.loads(self.request.body)
+                if not isinstance(data, dict):
+                    raise ValueError("update must be a JSON object")
+                update = Update.de_json(data, app.bot)
+                if update is None:  # de_json يعيد None لكائن فارغ
+                    raise ValueError("empty update")
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                # JSON صالح لكنه ليس تحديثاً (قائمة، رقم، حقول ناقصة)
+                logger.warning(f"⚠️ Rejected malformed webhook body: {e}")
+                self.set_status(400)
+                return
+            await app.update_queue.put(update)
+            self.set_status(200)
+
+    class HealthHandler(tornado.web.RequestHandler):
+        def get(self):
+            self.set_status(200 if app.running else 503)
+            self.write({
+                'status': 'ok' if app.running else 'stopped',
+                'pending_updates': app.update_queue.qsize(),
+            })
+
+    web_app = tornado.web.Application([
+        (config.WEBHOOK_PATH, UpdateHandler),
+        ('/health', HealthHandler),
+    ])
+    ssl_ctx = None
+    if config.WEBHOOK_CERT and config.WEBHOOK_KEY:
+        ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_ctx.load_cert_chain(config.WEBHOOK_CERT, config.WEBHOOK_KEY)
+    return tornado.httpserver.HTTPServer(web_app, ssl_options=ssl_ctx, xheaders=True)
+
+async def run_webhook(app, allowed_updates=None):
+    """تشغيل التطبيق بوضع الـ webhook حتى استلام SIGINT/SIGTERM."""
+    if not config.WEBHOOK_SECRET:
+        # بدون السر يستطيع أي شخص يعرف المسار حقن تحديثات (أوامر أدمن مزيفة مثلاً)
+        raise RuntimeError("WEBHOOK_SECRET must be set in config.py to run in webhook mode")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    server = _make_server(app)
+    server.listen(config.WEBHOOK_PORT, address=config.WEBHOOK_LISTEN)
+    await app.start()
+    try:
+        if config.WEBHOOK_URL:
+            certificate = open(config.WEBHOOK_CERT, 'rb') if config.WEBHOOK_CERT else None
+            try:
+                await app.bot.set_webhook(
+                    url=config.WEBHOOK_URL.rstrip('/') + config.WEBHOOK_PATH,
+                    certificate=certificate,  # شهادة ذاتية التوقيع تُرفع لتيليجرام
+                    secret_token=config.WEBHOOK_SECRET or None,
+                    max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                    allowed_updates=allowed_updates,
+                )
+            finally:
+                if certificate:
+                    certificate.close()
+        logger.info(f"🌐 Webhook listening on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        server.stop()
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+def replay(path: str, url: str = None):
+    """إرسال تحديث مسجل (JSON) إلى الخادم المحلي كما يفعل تيليجرام."""
+    url = url or f"http://127.0.0.1:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}"
+    with open(path, 'rb') as f:
+        body = f.read()
+    request = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    if config.WEBHOOK_SECRET:
+        request.add_header(SECRET_HEADER, config.WEBHOOK_SECRET)
+    with urllib.request.urlopen(request) as response:
+        print(f"{response.status} {url}")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == 'replay':
+        replay(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print("Usage: python webhook.py replay <update.json> [url]")